@@ -3,10 +3,19 @@ LLM Math Agent
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain.agents import AgentType, initialize_agent
 from langchain_community.agent_toolkits.load_tools import load_tools
 from langchain_openai import OpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 llm = OpenAI(temperature=0)
 print("Model:", llm.model_name)
 
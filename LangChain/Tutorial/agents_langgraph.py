@@ -3,10 +3,19 @@ Same thing, but using LangGraph
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain_community.agent_toolkits.load_tools import load_tools
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 llm = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
 
 tools = load_tools(["llm-math"], llm=llm)
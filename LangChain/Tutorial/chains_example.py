@@ -3,9 +3,18 @@ AI Chatbot greeting user
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import OpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 # Prompt template instructs the assistant to respond in a friendly manner and address the user by name
 template = "You are a friendly assistant. Respond to the user by name.\nUser: {user_input}\nAssistant:"
 prompt = PromptTemplate(template=template, input_variables=["user_input"])
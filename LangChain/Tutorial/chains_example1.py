@@ -3,9 +3,18 @@ Multi-Chain: chain multiple processing steps together
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import OpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 # First Chain: Summarization Step
 summarization_template = "Summarize this input concisely:\n{user_input}"
 summarization_prompt = PromptTemplate(
@@ -3,9 +3,18 @@ Create a simple chatbot that remembers previous messages in a conversation
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 chat = ChatOpenAI(temperature=0)
 message_history = []
 
@@ -4,9 +4,17 @@ Author: tdiprima
 """
 
 import os
+import sys
+from pathlib import Path
 
 from langchain_community.llms import HuggingFaceHub
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 # Set your Hugging Face API token
 os.environ["HUGGINGFACEHUB_API_TOKEN"] = "YOUR-HUGGINGFACE-API-TOKEN-HERE"
 
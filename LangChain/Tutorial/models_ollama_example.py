@@ -3,8 +3,17 @@ Llama3 Fact-Generating Agent
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain_ollama import OllamaLLM
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 # Initialize Llama3 using Ollama locally
 llm = OllamaLLM(model="llama3.2:latest")
 
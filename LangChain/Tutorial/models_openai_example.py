@@ -3,8 +3,17 @@ OpenAI Joke Generation
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain_openai import OpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 openai_llm = OpenAI(temperature=0.9)
 
 prompt = "Tell me a short joke about chickens."
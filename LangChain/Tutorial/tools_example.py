@@ -3,13 +3,21 @@ AI Agent that uses tools to answer questions
 Author: tdiprima
 """
 
+import sys
 import warnings
 from datetime import datetime
+from pathlib import Path
 
 from langchain.agents import AgentType, initialize_agent
 from langchain_core.tools import Tool
 from langchain_openai import OpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 warnings.filterwarnings("ignore")  # Suppress warnings for cleaner output
 
 
@@ -3,9 +3,18 @@ Agents: Agent with a Tool
 Creates an agent with a fake search tool.
 """
 
+import sys
+from pathlib import Path
+
 from langchain.agents import Tool, initialize_agent
 from langchain_openai import ChatOpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 
 # Make a fake tool (pretend it searches the web)
 def fake_search(query):
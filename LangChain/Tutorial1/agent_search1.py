@@ -5,11 +5,21 @@ for handling search queries via a chat-based interface.
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.tools import Tool
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+from streaming import STREAMING, stream_agent  # noqa: E402
+
+setup_llm_cache()
+
 
 def fake_search(query: str) -> str:
     """Use this tool when you need to search for information about any topic.
@@ -77,10 +87,14 @@ while True:
     if user_input.lower() == "quit":
         break
 
-    response = agent_executor.invoke(
-        {"input": user_input, "chat_history": chat_history}
-    )
-    print("\nAssistant:", response["output"])
+    inputs = {"input": user_input, "chat_history": chat_history}
+    if STREAMING:
+        # astream_events surfaces the final answer's tokens as they arrive
+        print()
+        response, _ = stream_agent(agent_executor, inputs)
+    else:
+        response = agent_executor.invoke(inputs)
+        print("\nAssistant:", response["output"])
 
 """
 Try asking questions about:
@@ -4,9 +4,18 @@ Builds a simple chain to greet someone.
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.8)
 
 prompt = PromptTemplate.from_template(
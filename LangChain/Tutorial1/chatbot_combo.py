@@ -3,12 +3,24 @@ Putting It All Together: A Mini Chatbot
 Combines chains, memory, and tools into a mini chatbot.
 """
 
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain_community.chat_message_histories import ChatMessageHistory
+import sys
+from pathlib import Path
+
+from langchain.agents import create_openai_tools_agent
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from history_compactor import CompactingChatHistory, HistoryCompactor  # noqa: E402
+from llm_cache import setup_llm_cache  # noqa: E402
+from long_term_memory import LongTermMemory  # noqa: E402
+from parallel_agent import ParallelAgentExecutor  # noqa: E402
+from streaming import STREAMING, stream_agent  # noqa: E402
+
+setup_llm_cache()
 
 llm = ChatOpenAI()
 
@@ -28,8 +40,15 @@ def whisper(text: str):
 # Create a list of tools
 tools = [shout, whisper]
 
-# Initialize chat history
-chat_history = ChatMessageHistory()
+# Initialize chat history; once it passes COMPACT_TOKEN_LIMIT tokens, older
+# turns are summarized in the background instead of resent in full
+chat_history = CompactingChatHistory()
+compactor = HistoryCompactor(ChatOpenAI(temperature=0))
+
+# Older turns are embedded in the background and the most relevant ones
+# recalled each turn, alongside the last few messages
+memory = LongTermMemory(OpenAIEmbeddings(), path=":memory:")
+SESSION_ID = "combo"
 
 # Define the prompt template with memory and system message
 prompt = ChatPromptTemplate.from_messages(
@@ -47,8 +66,8 @@ prompt = ChatPromptTemplate.from_messages(
 # Create the agent
 agent = create_openai_tools_agent(llm, tools, prompt)
 
-# Create the agent executor
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+# Create the agent executor; tool calls from one model turn run concurrently
+agent_executor = ParallelAgentExecutor(agent=agent, tools=tools, verbose=True)
 
 if __name__ == "__main__":
     print("Chat with the assistant (type 'quit' to exit)")
@@ -58,15 +77,25 @@ if __name__ == "__main__":
             break
 
         # Get response from agent
-        response = agent_executor.invoke(
-            {"input": user_input, "chat_history": chat_history.messages}
-        )
-
-        # Add messages to chat history
+        inputs = {
+            "input": user_input,
+            "chat_history": memory.build_history(
+                SESSION_ID, chat_history.messages, user_input
+            ),
+        }
+        if STREAMING:
+            response, _ = stream_agent(agent_executor, inputs)
+        else:
+            response = agent_executor.invoke(inputs)
+
+        # Add messages to chat history once the turn is complete
         chat_history.add_message(HumanMessage(content=user_input))
         chat_history.add_message(AIMessage(content=response["output"]))
+        compactor.maybe_compact(chat_history)
+        memory.remember(SESSION_ID, user_input, response["output"])
 
-        print("Assistant:", response["output"])
+        if not STREAMING:
+            print("Assistant:", response["output"])
 
 """
 Hi, I'm Zelda!
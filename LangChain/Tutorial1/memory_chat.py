@@ -4,13 +4,25 @@ Shows how to make an AI remember your name or preferences.
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
 from langchain_openai import ChatOpenAI
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.7)
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+from streaming import STREAMING, TokenStream  # noqa: E402
+from token_memory import TokenBudgetMemory  # noqa: E402
+
+setup_llm_cache()
 
-memory = ConversationBufferMemory()
+# streaming=True makes the model report each token to the callbacks
+llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.7, streaming=STREAMING)
+
+# Keeps recent turns verbatim and summarizes older ones so prompts stay small
+memory = TokenBudgetMemory(llm=llm, max_token_limit=1000)
 
 chain = ConversationChain(llm=llm, memory=memory)
 
@@ -20,6 +32,15 @@ while True:
     if user_input == "quit":
         break
 
-    response = chain.invoke({"input": user_input})
-
-    print("Assistant:", response["response"])
+    if STREAMING:
+        # Memory is saved by the chain after the reply is complete
+        stream = TokenStream("Assistant: ")
+        response = chain.invoke({"input": user_input}, config={"callbacks": [stream]})
+        stream.finish()
+        if not stream.parts:
+            # Nothing streamed, e.g. the reply came from the LLM cache
+            print("Assistant:", response["response"])
+    else:
+        response = chain.invoke({"input": user_input})
+
+        print("Assistant:", response["response"])
@@ -7,12 +7,20 @@ Author: tdiprima
 """
 
 import json
+import sys
+from pathlib import Path
 from typing import Sequence, TypedDict
 
 from langchain_core.messages import HumanMessage
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 
 # Define our state
 class AgentState(TypedDict):
@@ -8,6 +8,8 @@ Author: tdiprima
 """
 
 import json
+import sys
+from pathlib import Path
 from typing import List, TypedDict
 
 from langchain_core.messages import AIMessage, HumanMessage
@@ -15,6 +17,12 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 
 # Define a tool
 @tool
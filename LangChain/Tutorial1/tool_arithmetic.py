@@ -4,11 +4,21 @@ Uses tools to solve math problems.
 Author: tdiprima
 """
 
-from langchain.agents import AgentExecutor, create_openai_tools_agent
+import sys
+from pathlib import Path
+
+from langchain.agents import create_openai_tools_agent
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+from parallel_agent import ParallelAgentExecutor  # noqa: E402
+
+setup_llm_cache()
+
 llm = ChatOpenAI()
 
 
@@ -54,8 +64,8 @@ prompt = ChatPromptTemplate.from_messages(
 # Create the agent
 agent = create_openai_tools_agent(llm, tools, prompt)
 
-# Create the agent executor
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+# Create the agent executor; tool calls from one model turn run concurrently
+agent_executor = ParallelAgentExecutor(agent=agent, tools=tools, verbose=True)
 
 # Example usage
 if __name__ == "__main__":
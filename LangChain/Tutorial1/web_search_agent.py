@@ -5,12 +5,21 @@ executes search queries via a chatbot interface.
 Author: tdiprima
 """
 
+import sys
+from pathlib import Path
+
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.tools.render import format_tool_to_openai_function
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_openai import ChatOpenAI
 
+# Shared helpers live in the parent LangChain/ directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 # Initialize the Tavily search tool
 search_tool = TavilySearchResults(max_results=3)
 
@@ -0,0 +1,227 @@
+"""
+Batch runner for the Diabetes Medication Advisor
+Streams patient queries from a JSONL file through process_query with a global
+cap on queries in flight, writing each result as soon as it completes.
+Guideline searches and (medication, condition) label checks repeated across
+queries are fetched once per batch.
+
+Input lines look like:
+    {"id": "p1", "query": "...", "medications": ["metformin", "insulin"], "condition": "kidney disease"}
+Only "query" is required; the rest fall back to process_query's defaults.
+
+Usage:
+    python advisor_batch.py queries.jsonl results.jsonl --concurrency 8
+Note: Requires SERPAPI_API_KEY and OPENAI_API_KEY
+Author: tdiprima
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+
+from diabetes_med_advisor import (
+    GUIDELINES_FAILED,
+    LABEL_FAILED,
+    MAX_WORKERS,
+    RESPONSE_FAILED,
+    check_drug_contraindications,
+    process_query,
+    retrieve_medical_guidelines,
+)
+from fda_cache import label_cache, normalize_key
+
+# What the lookups return instead of raising when the request itself fails;
+# "No data available." is a real answer and is shared like any other
+FAILED_RESULTS = {GUIDELINES_FAILED, LABEL_FAILED}
+
+
+class SharedLookups:
+    """Run each distinct lookup once per batch; later callers wait on the first.
+
+    Failed lookups are handed to the callers already waiting but not kept, so
+    the next caller with the same key tries again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.fetched = 0
+        self.reused = 0
+
+    def _once(self, key, func, *args):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+                self.fetched += 1
+            else:
+                self.reused += 1
+        if owner:
+            try:
+                result = func(*args)
+            except BaseException as e:
+                self._forget(key)
+                future.set_exception(e)
+            else:
+                if result in FAILED_RESULTS:
+                    self._forget(key)
+                future.set_result(result)
+        return future.result()
+
+    def _forget(self, key):
+        with self._lock:
+            self._futures.pop(key, None)
+
+    def guidelines(self, query):
+        return self._once(("guidelines", query), retrieve_medical_guidelines, query)
+
+    def contraindications(self, medication, condition):
+        key = ("fda", normalize_key(medication, condition))
+        return self._once(key, check_drug_contraindications, medication, condition)
+
+
+class LatencyStats:
+    """Throughput plus p50/p95 latency over a fixed-size reservoir sample."""
+
+    def __init__(self, reservoir_size=10000):
+        self.reservoir_size = reservoir_size
+        self.samples = []
+        self.count = 0
+        self.errors = 0
+        self.start = time.perf_counter()
+
+    def add(self, latency):
+        self.count += 1
+        if len(self.samples) < self.reservoir_size:
+            self.samples.append(latency)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.reservoir_size:
+                self.samples[slot] = latency
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        return (
+            f"{self.count} queries ({self.errors} failed) in {elapsed:.1f}s, "
+            f"{self.count / elapsed if elapsed else 0:.2f} queries/s, "
+            f"p50 {self.percentile(50):.2f}s, p95 {self.percentile(95):.2f}s"
+        )
+
+
+def iter_queries(path):
+    """Yield query records one line at a time, numbering those without an id.
+
+    A line that is not a JSON object is yielded as {"id": line_no, "error": ...}
+    so it gets an error row instead of stopping the batch.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield {"id": line_no, "error": f"line {line_no}: invalid JSON ({e})"}
+                continue
+            if not isinstance(record, dict):
+                yield {"id": line_no, "error": f"line {line_no}: not a JSON object"}
+                continue
+            record.setdefault("id", line_no)
+            yield record
+
+
+def run_one(record, lookups):
+    """Answer a single record; errors are reported in the result, not raised."""
+    start = time.perf_counter()
+    result = {"id": record.get("id"), "query": record.get("query")}
+    try:
+        if "error" in record:
+            raise ValueError(record["error"])
+        if not isinstance(record.get("query"), str):
+            raise ValueError('record has no "query" string')
+        kwargs = {k: record[k] for k in ("medications", "condition") if k in record}
+        recommendation = process_query(
+            record["query"],
+            verbose=False,
+            retrieve=lookups.guidelines,
+            check=lookups.contraindications,
+            **kwargs,
+        )
+        if recommendation == RESPONSE_FAILED:
+            raise RuntimeError(recommendation)
+        result["recommendation"] = recommendation
+    except Exception as e:
+        result["error"] = str(e)
+    result["latency_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(input_path, output_path, concurrency=MAX_WORKERS, report_every=10):
+    """Process every query in input_path, writing results to output_path.
+
+    At most `concurrency` queries are read ahead and in flight, so memory stays
+    flat no matter how long the input is. Lookups inside each query run
+    serially; the cap applies across queries.
+    """
+    lookups = SharedLookups()
+    stats = LatencyStats()
+
+    def record_result(future, out):
+        result = future.result()
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        stats.add(result["latency_s"])
+        stats.errors += "error" in result
+        if stats.count % report_every == 0:
+            print(f"[progress] {stats.summary()}", file=sys.stderr)
+
+    with open(output_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(
+        max_workers=concurrency
+    ) as pool:
+        in_flight = set()
+        for record in iter_queries(input_path):
+            if len(in_flight) >= concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record_result(future, out)
+            in_flight.add(pool.submit(run_one, record, lookups))
+        for future in as_completed(in_flight):
+            record_result(future, out)
+
+    print(f"Done: {stats.summary()}")
+    print(
+        f"Shared lookups: {lookups.fetched} fetched, {lookups.reused} reused; "
+        f"openFDA cache: {label_cache.stats()}"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("input", help="JSONL file of patient queries")
+    parser.add_argument("output", help="JSONL file to write recommendations to")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=MAX_WORKERS,
+        help="maximum queries in flight (default: ADVISOR_MAX_WORKERS)",
+    )
+    args = parser.parse_args()
+    run_batch(args.input, args.output, args.concurrency)
@@ -6,6 +6,10 @@ Author: tdiprima
 from langchain.agents import AgentType, Tool, initialize_agent
 from langchain_openai import OpenAI
 
+from llm_cache import setup_llm_cache
+
+setup_llm_cache()
+
 
 def add_numbers(input_str: str) -> str:
     try:
@@ -0,0 +1,362 @@
+"""
+Async multi-session chat server for chat_with_memory.py's conversation
+Serves create_conversation() over a small HTTP/1.1 API, on TCP or a Unix
+socket, with ainvoke so thousands of sessions share one event loop:
+  POST /chat  {"session_id": "...", "input": "..."} -> {"output": "..."}
+  GET  /stats
+Turns of one session run one at a time under a per-session lock, so each
+turn sees the previous one in its history. At most max_in_flight LLM calls
+run at once; up to max_queue more requests wait for a slot and beyond that
+the server answers 503 right away (backpressure) instead of queueing without
+bound. A turn whose model call fails answers 502 with the error. Every call
+goes through one pooled httpx client, and sessions past COMPACT_TOKEN_LIMIT
+tokens are summarized in the background. Each prompt
+holds the recent window plus recalled earlier turns (long_term_memory.py).
+  python chat_server.py serve [--port 8765 | --unix /tmp/chat.sock]
+  python chat_server.py loadtest --sessions 1000 --turns 3
+The load test runs the server against a local fake LLM with fixed latency.
+Author: tdiprima
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import deque
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from chat_with_memory import create_conversation, store
+from history_compactor import HistoryCompactor
+from long_term_memory import LongTermMemory
+from session_store import SessionStore
+
+MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "64"))
+MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "1000"))
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+
+class ServerBusy(Exception):
+    """Raised when max_in_flight calls are running and max_queue are waiting."""
+
+
+class ChatServer:
+    """Runs conversation turns with per-session ordering and a global LLM cap."""
+
+    def __init__(self, conversation, max_in_flight=MAX_IN_FLIGHT, max_queue=MAX_QUEUE):
+        self.conversation = conversation
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_in_flight)
+        # session_id -> [lock, number of turns holding or waiting for it]
+        self._locks = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._latencies = deque(maxlen=10000)
+        self._connections = set()
+        self.peak_in_flight = 0
+        self.served = 0
+        self.rejected = 0
+        self.errors = 0
+
+    async def chat(self, session_id, text):
+        """Run one turn and return the reply text; raises ServerBusy when full."""
+        if self._pending >= self.max_in_flight + self.max_queue:
+            self.rejected += 1
+            raise ServerBusy()
+        self._pending += 1
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        start = time.perf_counter()
+        try:
+            async with entry[0], self._slots:
+                self._in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+                try:
+                    response = await self.conversation.ainvoke(
+                        {"input": text},
+                        config={"configurable": {"session_id": session_id}},
+                    )
+                finally:
+                    self._in_flight -= 1
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._pending -= 1
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+        self.served += 1
+        self._latencies.append(time.perf_counter() - start)
+        return response.content
+
+    def stats(self):
+        """Request counters, in-flight calls and turn latency percentiles."""
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return (
+                round(latencies[int(p * (len(latencies) - 1))], 3)
+                if latencies
+                else None
+            )
+
+        return {
+            "served": self.served,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "pending": self._pending,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "active_sessions": len(self._locks),
+            "p50_s": percentile(0.5),
+            "p95_s": percentile(0.95),
+        }
+
+    async def _route(self, method, path, body):
+        if method == "GET" and path == "/stats":
+            return 200, self.stats()
+        if method != "POST" or path != "/chat":
+            return 404, {"error": "not found"}
+        try:
+            request = json.loads(body)
+            session_id, text = str(request["session_id"]), str(request["input"])
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": 'expected {"session_id": ..., "input": ...}'}
+        try:
+            return 200, {"output": await self.chat(session_id, text)}
+        except ServerBusy:
+            return 503, {"error": "server busy, retry later"}
+        except Exception as e:
+            # The model or a history/memory backend failed; keep the connection
+            return 502, {"error": f"{type(e).__name__}: {e}"}
+
+    async def handle(self, reader, writer):
+        """Serve keep-alive HTTP/1.1 requests on one connection."""
+        self._connections.add(asyncio.current_task())
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                try:
+                    status, payload = await self._route(*request)
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                write_response(writer, status, payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.discard(asyncio.current_task())
+            writer.close()
+
+    async def wait_idle(self):
+        """Wait until every client has hung up."""
+        while self._connections:
+            await asyncio.wait(set(self._connections))
+
+    async def start(self, host="127.0.0.1", port=8765, unix=None):
+        if unix:
+            return await asyncio.start_unix_server(self.handle, path=unix)
+        return await asyncio.start_server(self.handle, host, port, backlog=1024)
+
+
+async def read_request(reader):
+    """(method, path, body) of the next request, or None at end of stream."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, path, _ = line.decode("latin-1").split(" ", 2)
+    length = 0
+    while (header := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = header.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    body = await reader.readexactly(length) if length else b""
+    return method, path, body
+
+
+def write_response(writer, status, payload):
+    data = json.dumps(payload).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+        + data
+    )
+
+
+def pooled_llm(max_connections):
+    """ChatOpenAI whose requests all share one keep-alive connection pool."""
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+    return ChatOpenAI(temperature=0.7, http_async_client=client)
+
+
+async def serve(host, port, unix, max_in_flight, max_queue):
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+    # Long sessions are summarized on worker threads, never inside a turn
+    store.listeners.append(HistoryCompactor(ChatOpenAI(temperature=0)).on_messages)
+    # Prompts carry the recent window plus recalled earlier turns
+    memory = LongTermMemory(OpenAIEmbeddings())
+    store.listeners.append(memory.on_messages)
+    server = ChatServer(
+        create_conversation(pooled_llm(max_in_flight), memory=memory),
+        max_in_flight,
+        max_queue,
+    )
+    listener = await server.start(host, port, unix)
+    print(f"Serving chat on {unix or f'http://{host}:{port}'} (POST /chat, GET /stats)")
+    async with listener:
+        await listener.serve_forever()
+
+
+class FakeLatencyChat(BaseChatModel):
+    """Replies after a fixed delay with the history length it saw and the input."""
+
+    latency: float = 0.05
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+    @staticmethod
+    def _reply(messages):
+        text = f"{len(messages)}|{messages[-1].content}"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    @property
+    def _llm_type(self):
+        return "fake-latency-chat"
+
+
+async def post_chat(connections, session_id, text):
+    """POST one turn over a pooled keep-alive connection, backing off on 503."""
+    body = json.dumps({"session_id": session_id, "input": text}).encode()
+    delay = 0.05
+    while True:
+        reader, writer = await connections.get()
+        try:
+            writer.write(
+                b"POST /chat HTTP/1.1\r\nHost: localhost\r\n"
+                b"Content-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while (header := await reader.readline()) != b"\r\n":
+                name, _, value = header.decode().partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            payload = json.loads(await reader.readexactly(length))
+        finally:
+            connections.put_nowait((reader, writer))
+        if status != 503:
+            return payload
+        await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+        delay = min(delay * 2, 2.0)
+
+
+async def load_test(sessions, turns, connections, latency, max_in_flight, max_queue):
+    """Fire every turn of every session at once and check each history's order."""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(path=os.path.join(tmp, "sessions.sqlite3"))
+        conversation = create_conversation(FakeLatencyChat(latency=latency), store.get)
+        server = ChatServer(conversation, max_in_flight, max_queue)
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        pool = asyncio.Queue()
+        for _ in range(connections):
+            pool.put_nowait(await asyncio.open_connection("127.0.0.1", port))
+
+        start = time.perf_counter()
+        # A session's turns are sent concurrently, like a user double-submitting;
+        # the per-session lock must still run them one after another
+        await asyncio.gather(
+            *(
+                post_chat(pool, f"user{s}", f"turn {t}")
+                for t in range(turns)
+                for s in range(sessions)
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+        out_of_order = 0
+        for s in range(sessions):
+            messages = store.get(f"user{s}").messages
+            replies = [m.content for m in messages[1::2]]
+            # The system prompt plus two messages per earlier turn
+            seen = [int(reply.split("|")[0]) for reply in replies]
+            out_of_order += seen != [2 + 2 * t for t in range(turns)]
+        while not pool.empty():
+            pool.get_nowait()[1].close()
+        await server.wait_idle()
+        listener.close()
+        await listener.wait_closed()
+
+    requests = sessions * turns
+    print(
+        f"{requests} turns over {sessions} sessions in {elapsed:.2f}s "
+        f"({requests / elapsed:.0f} turns/s, fake LLM latency {latency}s)"
+    )
+    print(f"Server: {server.stats()}")
+    print(f"Sessions with out-of-order history: {out_of_order}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["serve", "loadtest"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="serve on this Unix socket path instead")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(
+            serve(args.host, args.port, args.unix, args.max_in_flight, args.max_queue)
+        )
+    else:
+        asyncio.run(
+            load_test(
+                args.sessions,
+                args.turns,
+                args.connections,
+                args.latency,
+                args.max_in_flight,
+                args.max_queue,
+            )
+        )
@@ -1,33 +1,43 @@
 """
 Uses LangChain's memory to maintain chat history.
 Implements a conversational AI that persists history across sessions.
+Histories live in a SessionStore: recent sessions in memory, all of them in
+SQLite (SESSION_DB_PATH), so a restarted script picks up where it left off.
+For many concurrent users, serve the same conversation with chat_server.py.
 Author: tdiprima
 """
 
 import os
 
-from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from history_compactor import HistoryCompactor
+from llm_cache import setup_llm_cache
+from long_term_memory import LongTermMemory
+from session_store import SessionStore
+from streaming import STREAMING, print_stream
+
+setup_llm_cache()
 
 api_key = os.getenv("OPENAI_API_KEY")
 
-# Store for chat histories (in-memory for this example)
-store = {}
+# Store for chat histories: an LRU of SESSION_CACHE_SIZE hot sessions in
+# memory, every message appended to SQLite
+store = SessionStore()
 
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
     """Retrieve or create a chat history for the given session."""
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    return store.get(session_id)
 
 
-def create_conversation():
+def create_conversation(llm=None, session_history=get_session_history, memory=None):
     # Initialize the language model
-    llm = ChatOpenAI(temperature=0.7)
+    llm = llm or ChatOpenAI(temperature=0.7)
 
     # Create a custom prompt template
     prompt = ChatPromptTemplate.from_messages(
@@ -43,11 +53,20 @@ def create_conversation():
 
     # Create the runnable chain with history
     chain = prompt | llm
+    if memory is not None:
+        # Send the recent window plus recalled earlier turns, not the whole
+        # transcript, so the prompt stays the same size
+        def recall(inputs, config):
+            return memory.build_history(
+                config["configurable"]["session_id"], inputs["history"], inputs["input"]
+            )
+
+        chain = RunnablePassthrough.assign(history=recall) | chain
 
     # Wrap the chain with message history
     conversation = RunnableWithMessageHistory(
         chain,
-        get_session_history,
+        session_history,
         input_messages_key="input",
         history_messages_key="history",
     )
@@ -56,8 +75,17 @@ def create_conversation():
 
 
 def main():
+    # Once a session passes COMPACT_TOKEN_LIMIT tokens, summarize its older
+    # turns in the background so the prompt stops growing
+    store.listeners.append(HistoryCompactor(ChatOpenAI(temperature=0)).on_messages)
+
+    # Past turns are embedded in the background after each reply; each
+    # prompt recalls the LTM_K most relevant ones beyond the last LTM_WINDOW
+    memory = LongTermMemory(OpenAIEmbeddings())
+    store.listeners.append(memory.on_messages)
+
     # Create the conversation instance
-    convo = create_conversation()
+    convo = create_conversation(memory=memory)
     session_id = "user_session"  # Simple session ID for this example
 
     # Example conversation loop
@@ -67,11 +95,15 @@ def main():
         if user_input.lower() == "quit":
             break
 
-        # Invoke the conversation with the input and session ID
-        response = convo.invoke(
-            {"input": user_input}, config={"configurable": {"session_id": session_id}}
-        )
-        print(f"AI: {response.content}")
+        config = {"configurable": {"session_id": session_id}}
+        if STREAMING:
+            # Tokens print as they arrive; the turn is added to the history
+            # once the stream is exhausted
+            print_stream(convo.stream({"input": user_input}, config=config))
+        else:
+            # Invoke the conversation with the input and session ID
+            response = convo.invoke({"input": user_input}, config=config)
+            print(f"AI: {response.content}")
 
 
 if __name__ == "__main__":
@@ -4,25 +4,48 @@ Note: Requires SERPAPI_API_KEY and OPENAI_API_KEY
 Author: tdiprima
 """
 
+import os
+
 import requests
 from langchain.agents import AgentType, Tool, initialize_agent
-from langchain.memory import ConversationBufferMemory
 from langchain_community.utilities import SerpAPIWrapper
 from langchain_openai import ChatOpenAI
 
+from fda_cache import label_cache, label_text
+from fda_label_index import get_index
+from http_client import http
+from llm_cache import setup_llm_cache
+from token_memory import TokenBudgetMemory
+
+setup_llm_cache()
+
+# "api" queries api.fda.gov; "local" searches the offline index built by fda_label_index.py
+FDA_BACKEND = os.getenv("FDA_BACKEND", "api")
+
 
 # Define a function to fetch drug contraindications
-def check_drug_contraindications(medication, condition):
+def check_drug_contraindications(medication, condition, backend=FDA_BACKEND):
     """Fetch drug contraindications based on a condition."""
+    if backend == "local":
+        return get_index().lookup(medication, condition)
+    cached = label_cache.get(medication, condition)
+    if cached is not None:
+        return cached
     url = f"https://api.fda.gov/drug/label.json?search={medication}+AND+{condition}"
-    response = requests.get(url)
+    try:
+        response = http.get(url)
+    except requests.RequestException as e:
+        print(f"FDA API error: {e}")
+        return "No data available."
     if response.status_code == 200:
-        return (
+        warnings = label_text(
             response.json()
             .get("results", [{}])[0]
             .get("warnings", "No warnings found.")
         )
-    return "No data available"
+        label_cache.put(medication, condition, warnings)
+        return warnings
+    return "No data available."
 
 
 # Define an agent tool for checking contraindications
@@ -67,7 +90,10 @@ tools = [
     ),
 ]
 
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+# Recent turns verbatim up to 1000 tokens; older turns are summarized by the LLM
+memory = TokenBudgetMemory(
+    llm=llm, max_token_limit=1000, memory_key="chat_history", return_messages=True
+)
 agent = initialize_agent(
     tools=tools,
     llm=llm,
@@ -81,3 +107,4 @@ query = "What is the best medication for a diabetic patient with kidney disease?
 response = agent.run(query)
 
 print(response)
+print(f"openFDA cache: {label_cache.stats()}")
@@ -5,9 +5,24 @@ Note: Requires SERPAPI_API_KEY and OPENAI_API_KEY
 Author: tdiprima
 """
 
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+import urllib3
+
+from fda_cache import label_cache, label_text
+from fda_label_index import NO_DATA, get_index
+from http_client import http
+from prompt_budget import (
+    PROMPT_TOKEN_BUDGET,
+    Evidence,
+    fit_to_budget,
+    format_report,
+    relevance,
+)
 
 # Load API keys from environment variables
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
@@ -18,6 +33,26 @@ if not SERPAPI_API_KEY or not OPENAI_API_KEY:
         "Missing SERPAPI_API_KEY or OPENAI_API_KEY in environment variables."
     )
 
+# Point at any OpenAI-compatible server, e.g. a local stub for testing
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+# Seconds to wait for the connection, and for each read of the reply or stream
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# Upper bound on simultaneous SerpAPI/openFDA lookups in concurrent mode
+MAX_WORKERS = int(os.getenv("ADVISOR_MAX_WORKERS", "8"))
+
+# "api" queries api.fda.gov; "local" searches the offline index built by fda_label_index.py
+FDA_BACKEND = os.getenv("FDA_BACKEND", "api")
+
+# Returned when a request fails, as opposed to a lookup that finds nothing
+GUIDELINES_FAILED = "Failed to retrieve guidelines."
+LABEL_FAILED = "Failed to retrieve drug label."
+RESPONSE_FAILED = "Failed to generate response."
+
+# One pooled session shared by every call so worker threads reuse connections;
+# lookups go through http.get for adaptive timeouts and hedging
+session = http.session
+
 
 # Function to fetch medical guidelines via SerpAPI
 def retrieve_medical_guidelines(query):
@@ -30,7 +65,8 @@ def retrieve_medical_guidelines(query):
         "num": 5,  # Limit to 5 results for brevity
     }
     try:
-        response = requests.get(url, params=params)
+        # Every SerpAPI search is billed, so never send a hedged duplicate
+        response = http.get(url, params=params, hedge=False)
         response.raise_for_status()
         results = response.json().get("organic_results", [])
         # Extract snippets from top results
@@ -40,30 +76,38 @@ def retrieve_medical_guidelines(query):
         return "\n".join(guidelines) if guidelines else "No guidelines found."
     except requests.RequestException as e:
         print(f"SerpAPI error: {e}")
-        return "Failed to retrieve guidelines."
+        return GUIDELINES_FAILED
 
 
 # Function to fetch drug contraindications via FDA API
-def check_drug_contraindications(medication, condition):
+def check_drug_contraindications(medication, condition, backend=FDA_BACKEND):
     """Fetch drug contraindications based on a condition."""
+    if backend == "local":
+        return get_index().lookup(medication, condition)
+    cached = label_cache.get(medication, condition)
+    if cached is not None:
+        return cached
     url = f"https://api.fda.gov/drug/label.json?search={medication}+AND+{condition}"
     try:
-        response = requests.get(url)
+        response = http.get(url)
+        # openFDA answers a search with no matching label with 404
+        if response.status_code == 404:
+            return NO_DATA
         response.raise_for_status()
         data = response.json()
-        warnings = data.get("results", [{}])[0].get("warnings", ["No warnings found."])[
-            0
-        ]
+        warnings = label_text(
+            data.get("results", [{}])[0].get("warnings", "No warnings found.")
+        )
+        label_cache.put(medication, condition, warnings)
         return warnings
     except requests.RequestException as e:
         print(f"FDA API error: {e}")
-        return "No data available."
+        return LABEL_FAILED
 
 
-# Function to call OpenAI API directly
-def generate_response(prompt):
-    """Generate a response using OpenAI API."""
-    url = "https://api.openai.com/v1/chat/completions"
+# Build the chat completion request shared by the blocking and streaming calls
+def _chat_request(prompt, stream=False):
+    url = f"{OPENAI_BASE_URL}/chat/completions"
     headers = {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json",
@@ -80,54 +124,207 @@ def generate_response(prompt):
         "temperature": 0,
         "max_tokens": 500,
     }
+    if stream:
+        payload["stream"] = True
+    return url, headers, payload
+
+
+# Function to stream tokens from the OpenAI API as server-sent events
+def stream_response(prompt, timings=None):
+    """Yield response tokens as they arrive.
+
+    If a timings dict is passed it is filled with ttft_s (time to first token),
+    total_s and tokens once the stream finishes.
+    """
+    url, headers, payload = _chat_request(prompt, stream=True)
+    start = time.perf_counter()
+    first_token = None
+    tokens = 0
+    with session.post(
+        url, headers=headers, json=payload, stream=True, timeout=OPENAI_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        # Read the socket line by line: iter_lines waits for a full chunk, which
+        # without chunked framing can mean the whole reply
+        response.raw.decode_content = True
+        try:
+            for raw_line in iter(response.raw.readline, b""):
+                line = raw_line.decode("utf-8").strip()
+                # Each event is a "data: {...}" line; blank lines separate events
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:") :].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                token = choices[0].get("delta", {}).get("content")
+                if not token:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                tokens += 1
+                yield token
+        # Reading response.raw skips requests' own exception wrapping
+        except urllib3.exceptions.ReadTimeoutError as e:
+            raise requests.ReadTimeout(e) from e
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.ConnectionError(e) from e
+        except (ValueError, AttributeError) as e:
+            raise requests.exceptions.InvalidJSONError(
+                f"malformed stream event: {e}"
+            ) from e
+    if timings is not None:
+        timings.update(
+            ttft_s=first_token, total_s=time.perf_counter() - start, tokens=tokens
+        )
+
+
+# Function to call OpenAI API directly
+def generate_response(prompt, stream=False):
+    """Generate a response using OpenAI API.
+
+    With stream=True tokens are echoed to the console as they arrive and the
+    time to first token is reported; the full text is still returned.
+    """
+    parts = []
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        if stream:
+            timings = {}
+            for token in stream_response(prompt, timings):
+                print(token, end="", flush=True)
+                parts.append(token)
+            print()
+            if timings["ttft_s"] is not None:
+                print(
+                    f"[time to first token {timings['ttft_s']:.2f}s, "
+                    f"{timings['tokens']} tokens in {timings['total_s']:.2f}s]"
+                )
+            return "".join(parts)
+        url, headers, payload = _chat_request(prompt)
+        response = session.post(
+            url, headers=headers, json=payload, timeout=OPENAI_TIMEOUT
+        )
         response.raise_for_status()
         return response.json()["choices"][0]["message"]["content"]
     except requests.RequestException as e:
+        if parts:
+            print()  # end the partly streamed line
         print(f"OpenAI API error: {e}")
-        return "Failed to generate response."
+        return RESPONSE_FAILED
+
+
+# Fetch guidelines and contraindications, optionally all at once
+def gather_evidence(
+    guideline_query, medications, condition, max_workers=None, retrieve=None, check=None
+):
+    """Run the guideline search and one contraindication check per medication.
+
+    With max_workers of 1 (or None) the lookups run one after another; otherwise
+    they are submitted together to a thread pool capped at max_workers.
+    retrieve/check default to retrieve_medical_guidelines and
+    check_drug_contraindications; batch mode swaps in deduplicating versions.
+    Returns (guidelines, contraindications) where contraindications maps each
+    medication to its warning text, in the order given.
+    """
+    retrieve = retrieve or retrieve_medical_guidelines
+    check = check or check_drug_contraindications
+    if not max_workers or max_workers <= 1:
+        guidelines = retrieve(guideline_query)
+        contraindications = {med: check(med, condition) for med in medications}
+        return guidelines, contraindications
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        guidelines_future = pool.submit(retrieve, guideline_query)
+        med_futures = {med: pool.submit(check, med, condition) for med in medications}
+        guidelines = guidelines_future.result()
+        contraindications = {
+            med: future.result() for med, future in med_futures.items()
+        }
+    return guidelines, contraindications
 
 
 # Main logic
-def process_query(query):
-    """Process a medical query and return a recommendation."""
-    # Step 1: Retrieve guidelines
-    guideline_query = "diabetes treatment guidelines kidney disease"
-    guidelines = retrieve_medical_guidelines(guideline_query)
-    print("Retrieved Guidelines:")
-    print(guidelines)
-    print("\n")
-
-    # Step 2: Check contraindications for common diabetes meds
-    medications = ["metformin", "insulin", "sitagliptin"]  # Example meds
-    condition = "kidney disease"
-    contraindications = {}
-    for med in medications:
-        result = check_drug_contraindications(med, condition)
-        contraindications[med] = result
-        print(f"Contraindications for {med}:")
-        print(result)
+def process_query(
+    query,
+    medications=("metformin", "insulin", "sitagliptin"),  # Example meds
+    condition="kidney disease",
+    concurrent=False,
+    max_workers=MAX_WORKERS,
+    verbose=True,
+    retrieve=None,
+    check=None,
+    stream=False,
+):
+    """Process a medical query and return a recommendation.
+
+    Set concurrent=True to run the guideline search and every contraindication
+    check at the same time (at most max_workers in flight). verbose=False skips
+    printing the evidence, retrieve/check override the lookup functions
+    (see gather_evidence) and stream=True prints the answer as it is generated.
+    """
+    # Steps 1 & 2: Retrieve guidelines and check contraindications for the meds
+    guideline_query = f"diabetes treatment guidelines {condition}"
+    guidelines, contraindications = gather_evidence(
+        guideline_query,
+        medications,
+        condition,
+        max_workers=max_workers if concurrent else None,
+        retrieve=retrieve,
+        check=check,
+    )
+    if verbose:
+        print("Retrieved Guidelines:")
+        print(guidelines)
         print("\n")
 
-    # Step 3: Generate recommendation with OpenAI
+        for med, result in contraindications.items():
+            print(f"Contraindications for {med}:")
+            print(result)
+            print("\n")
+
+    # Step 3: Fit the evidence into the token budget. Warnings are ranked above
+    # search snippets since they carry the safety information.
+    topic = f"{query} {condition}"
+    pieces = [
+        Evidence(f"guideline-{i}", snippet, relevance(snippet, topic))
+        for i, snippet in enumerate(guidelines.splitlines())
+        if snippet.strip()
+    ]
+    pieces += [
+        Evidence(med, str(result), 1.0 + relevance(str(result), topic))
+        for med, result in contraindications.items()
+    ]
+    # Token budget for the guideline/contraindication evidence in the prompt
+    kept, report = fit_to_budget(pieces, budget=PROMPT_TOKEN_BUDGET)
+    kept = {piece.key: piece.text for piece in kept}
+    if verbose:
+        print(format_report(report))
+
+    # Step 4: Generate recommendation with OpenAI
+    guidelines = "\n".join(
+        text for key, text in kept.items() if key.startswith("guideline-")
+    )
+    contraindication_lines = "\n".join(
+        f"      - {med.capitalize()}: {kept.get(med, '(omitted to fit token budget)')}"
+        for med in contraindications
+    )
     prompt = f"""
     Based on the following information:
     - Query: {query}
-    - Retrieved Guidelines: {guidelines}
+    - Retrieved Guidelines: {guidelines or "None within token budget."}
     - Contraindications:
-      - Metformin: {contraindications['metformin']}
-      - Insulin: {contraindications['insulin']}
-      - Sitagliptin: {contraindications['sitagliptin']}
-    Recommend the best medication for a diabetic patient with kidney disease and explain why.
+{contraindication_lines}
+    Recommend the best medication for a diabetic patient with {condition} and explain why.
     """
-    response = generate_response(prompt)
+    if stream and verbose:
+        print("Final Recommendation:")
+    response = generate_response(prompt, stream=stream)
     return response
 
 
 # Execute
 if __name__ == "__main__":
     query = "What is the best medication for a diabetic patient with kidney disease?"
-    response = process_query(query)
-    print("Final Recommendation:")
-    print(response)
+    response = process_query(query, concurrent=True, stream=True)
+    print(f"openFDA cache: {label_cache.stats()}")
+    print(f"HTTP latency: {http.stats()}")
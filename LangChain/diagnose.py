@@ -8,13 +8,20 @@ Author: tdiprima
 import logging
 import os
 
-import requests
 from langchain.agents import initialize_agent
 from langchain.tools import tool
-from langchain_community.vectorstores.faiss import FAISS
 from langchain_core.documents import Document
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
+from embedding_cache import CachedEmbeddings
+from http_client import http
+from hybrid_retriever import hybrid_retriever
+from llm_cache import setup_llm_cache
+from retrieval_cache import CachedRetriever
+from vector_store import load_or_build, store_version
+
+setup_llm_cache()
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("langchain")
@@ -40,9 +47,17 @@ documents = [
         page_content="Standard tests for unexplained weight loss include blood glucose, thyroid function tests, and kidney function tests."
     ),
 ]
-embeddings = OpenAIEmbeddings(openai_api_key=api_key, model="text-embedding-ada-002")
-vector_db = FAISS.from_documents(documents, embeddings)
-retriever = vector_db.as_retriever()
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(openai_api_key=api_key, model="text-embedding-ada-002")
+)
+vector_db = load_or_build(documents, embeddings, "medical")
+# BM25 + dense with rank fusion, so exact terms like drug names still match,
+# then near-duplicate removal and MMR so the top results aren't redundant.
+# Repeated lookups within one agent run are answered from an in-memory cache.
+retriever = CachedRetriever(
+    retriever=hybrid_retriever(vector_db, "medical", diversify=True),
+    version=lambda: store_version(vector_db),
+)
 
 
 # Tool: Retrieve medical knowledge
@@ -59,7 +74,7 @@ def check_symptom_disease_database(symptoms: str):
     """Step 2: Query an external API for possible disease matches after retrieving guidelines."""
     try:
         url = f"https://fake-medical-api.com/symptoms?query={symptoms}"
-        response = requests.get(url)
+        response = http.get(url)
         if response.status_code == 200:
             return response.json()
         return {"error": "Could not retrieve medical data."}
@@ -87,3 +102,5 @@ response = agent.run(input=query, chat_history=chat_history)
 
 print("\nFinal Response:")
 print(response)
+print(f"Embedding cache: {embeddings.stats()}")
+print(f"Retrieval cache: {retriever.stats()}")
@@ -0,0 +1,167 @@
+"""
+Post-retrieval near-duplicate removal and MMR re-ranking
+The top-k from a real corpus often holds several copies of the same passage,
+which spend prompt tokens without adding evidence. DiversifiedRetriever
+over-fetches candidates, drops near-duplicates by comparing MinHash
+signatures of their word shingles, and picks the final k with maximal
+marginal relevance (MMR) so the results are relevant but not redundant.
+Given the FAISS store the candidates came from, MMR reuses their indexed
+vectors rather than embedding every candidate again on each query.
+Author: tdiprima
+"""
+
+import hashlib
+import re
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from vector_store import live_store, reconstruct, store_version
+
+# Hashes, a and b are all below the Mersenne prime 2**31 - 1, so a * h + b
+# fits in uint64 and the modulo still mixes the bits thoroughly
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(42)
+_PERMUTATIONS = 128
+_A = _rng.integers(1, _PRIME, size=_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=_PERMUTATIONS, dtype=np.uint64)
+
+
+def shingles(text, size=3):
+    """Overlapping word n-grams; short texts give a single shingle."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(text, num_perm=_PERMUTATIONS):
+    """MinHash of the text's shingles under num_perm random hash permutations."""
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "big")
+            for s in shingles(text)
+        ),
+        dtype=np.uint64,
+    ) % np.uint64(_PRIME)
+    # (a * h + b) mod p for every permutation and shingle at once
+    permuted = (_A[:num_perm, None] * hashes + _B[:num_perm, None]) % _PRIME
+    return permuted.min(axis=1)
+
+
+def near_duplicates(texts, threshold=0.8):
+    """Indexes of texts that duplicate an earlier text.
+
+    Estimated Jaccard similarity is the fraction of matching MinHash slots,
+    computed for all pairs in one broadcast comparison.
+    """
+    if len(texts) < 2:
+        return set()
+    signatures = np.stack([minhash_signature(text) for text in texts])
+    jaccard = (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+    kept, duplicates = [0], set()
+    for i in range(1, len(texts)):
+        if jaccard[i, kept].max() >= threshold:
+            duplicates.add(i)
+        else:
+            kept.append(i)
+    return duplicates
+
+
+def mmr(query_vector, vectors, k=4, lambda_mult=0.5):
+    """Indexes of k vectors chosen by maximal marginal relevance.
+
+    Cosine similarities to the query and between all candidates come from
+    two matrix products; each greedy step is then a vectorized update.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) == 0:
+        return []
+    vectors = vectors / np.maximum(
+        np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12
+    )
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(np.linalg.norm(query), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
+
+
+class DiversifiedRetriever(BaseRetriever):
+    """Dedupe the wrapped retriever's candidates, then re-rank them with MMR."""
+
+    retriever: BaseRetriever
+    """Should return more than k candidates, e.g. search_kwargs={"k": 20}."""
+    embeddings: Embeddings
+    k: int = 4
+    lambda_mult: float = 0.5
+    """1.0 ranks by relevance only, 0.0 by diversity only."""
+    dedupe_threshold: float = 0.8
+    """Estimated Jaccard similarity at which two chunks count as duplicates."""
+    vector_store: object = None
+    """FAISS store (or IncrementalIndex) the candidates come from; their vectors
+    are read back from its index instead of being embedded again."""
+
+    _positions: tuple = PrivateAttr(default=(None, {}))
+
+    def _stored_vectors(self, docs):
+        """Vectors of the docs held by vector_store; None where it has none."""
+        if self.vector_store is None:
+            return [None] * len(docs)
+        store = live_store(self.vector_store)
+        # docstore id -> index position, rebuilt only when the store changes
+        key = (id(store), store_version(store), len(store.index_to_docstore_id))
+        if self._positions[0] != key:
+            self._positions = (
+                key,
+                {id_: i for i, id_ in store.index_to_docstore_id.items()},
+            )
+        positions = self._positions[1]
+        found = [i for i, doc in enumerate(docs) if doc.id in positions]
+        vectors = [None] * len(docs)
+        if found:
+            stored = reconstruct(
+                store.index,
+                np.array([positions[docs[i].id] for i in found], dtype=np.int64),
+            )
+            for i, vector in zip(found, stored):
+                vectors[i] = vector
+        return vectors
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        docs = self.retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        duplicates = near_duplicates(
+            [doc.page_content for doc in docs], self.dedupe_threshold
+        )
+        docs = [doc for i, doc in enumerate(docs) if i not in duplicates]
+        if len(docs) <= 1:
+            return docs
+        vectors = self._stored_vectors(docs)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self.embeddings.embed_documents(
+                [docs[i].page_content for i in missing]
+            )
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+        chosen = mmr(
+            self.embeddings.embed_query(query), vectors, self.k, self.lambda_mult
+        )
+        return [docs[i] for i in chosen]
@@ -0,0 +1,112 @@
+"""
+Content-addressed embedding cache shared by the RAG scripts
+CachedEmbeddings wraps any LangChain Embeddings and stores vectors in SQLite,
+keyed by (model, sha256(text)), as compact float32 or float16 blobs. Both
+embed_documents and embed_query check the cache first; all misses in a call
+are sent to the API as one batch. hits/misses are counted for reporting.
+Author: tdiprima
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from vector_store import embedding_model_id
+
+DEFAULT_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.expanduser("~/.cache/langchain-lab/embeddings.sqlite3"),
+)
+# SQLite's default limit on host parameters in one statement is 999
+_LOOKUP_CHUNK = 500
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from an on-disk cache."""
+
+    def __init__(self, embeddings, path=DEFAULT_PATH, dtype="float32"):
+        self.embeddings = embeddings
+        self.model = embedding_model_id(embeddings)
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, dtype TEXT NOT NULL, "
+            "vector BLOB NOT NULL, PRIMARY KEY (model, key))"
+        )
+        self._conn.commit()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start : start + _LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    "SELECT key, dtype, vector FROM embeddings WHERE model = ? "
+                    f"AND key IN ({','.join('?' * len(chunk))})",
+                    (self.model, *chunk),
+                )
+                for key, dtype, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=dtype).astype(float).tolist()
+        return found
+
+    def _store(self, keys, vectors):
+        rows = [
+            (self.model, key, self.dtype.str, np.asarray(v, dtype=self.dtype).tobytes())
+            for key, v in zip(keys, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, dtype, vector) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts):
+        keys = [text_key(text) for text in texts]
+        found = self._lookup(list(set(keys)))
+        # Unique misses only, so duplicates within one call are embedded once
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        miss_count = sum(key in missing for key in keys)
+        self.hits += len(keys) - miss_count
+        self.misses += miss_count
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            self._store(list(missing), vectors)
+            found.update(zip(missing, vectors))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = text_key(text)
+        found = self._lookup([key])
+        if key in found:
+            self.hits += 1
+            return found[key]
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store([key], [vector])
+        return vector
+
+    def stats(self):
+        """Hit/miss counters and hit rate since this wrapper was created."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
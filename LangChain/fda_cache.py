@@ -0,0 +1,127 @@
+"""
+Persistent cache for openFDA drug label lookups
+Repeated lookups, across runs and scripts, skip the network.
+Entries live in SQLite, expire after a TTL and are evicted least-recently-used
+once the cache grows past max_entries.
+Author: tdiprima
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.getenv(
+    "FDA_CACHE_PATH", os.path.expanduser("~/.cache/langchain-lab/fda_labels.sqlite3")
+)
+DEFAULT_TTL = float(os.getenv("FDA_CACHE_TTL", str(7 * 24 * 3600)))  # one week
+DEFAULT_MAX_ENTRIES = int(os.getenv("FDA_CACHE_MAX_ENTRIES", "10000"))
+
+
+def normalize_key(medication, condition):
+    """Lower-case and collapse whitespace so 'Metformin ' and 'metformin' share an entry."""
+    med = " ".join(str(medication).lower().split())
+    cond = " ".join(str(condition).lower().split())
+    return f"{med}|{cond}"
+
+
+def label_text(warnings):
+    """openFDA returns label sections as lists of paragraphs; cache them as one string."""
+    if isinstance(warnings, (list, tuple)):
+        return "\n".join(str(part) for part in warnings)
+    return str(warnings)
+
+
+class LabelCache:
+    """SQLite-backed TTL cache keyed by the normalized (medication, condition) pair."""
+
+    def __init__(
+        self, path=DEFAULT_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # The advisor looks labels up from worker threads, so share one
+        # connection behind a lock instead of opening one per thread.
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS labels (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS labels_accessed ON labels (accessed)"
+        )
+        self._conn.commit()
+
+    def get(self, medication, condition):
+        """Return the cached label text, or None on a miss or expired entry."""
+        key = normalize_key(medication, condition)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM labels WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM labels WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE labels SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, medication, condition, value):
+        """Store a label result and evict the least recently used entries over the cap."""
+        key = normalize_key(medication, condition)
+        value = label_text(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO labels (key, value, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM labels WHERE key IN ("
+                    "SELECT key FROM labels ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self):
+        """Drop every cached entry and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM labels")
+            self._conn.commit()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+# Shared instance used by both diabetes scripts
+label_cache = LabelCache()
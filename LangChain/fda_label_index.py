@@ -0,0 +1,257 @@
+"""
+Offline openFDA drug label index backed by SQLite FTS5
+Loads the openFDA drug label bulk downloads (https://open.fda.gov/data/downloads/)
+into a local full-text index so contraindication checks work with no network.
+Bulk files are streamed record by record, so memory stays bounded by the batch
+size rather than the file size (the raw files are several hundred MB each).
+
+Usage:
+    python fda_label_index.py load data/fda_label_sample.json
+    python fda_label_index.py query metformin "kidney disease"
+
+Set FDA_BACKEND=local to make the diabetes scripts use this index.
+Author: tdiprima
+"""
+
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+
+DEFAULT_PATH = os.getenv(
+    "FDA_INDEX_PATH",
+    os.path.expanduser("~/.cache/langchain-lab/fda_label_index.sqlite3"),
+)
+NO_WARNINGS = "No warnings found."
+NO_DATA = "No data available."
+
+
+def _open_text(path):
+    """Open a bulk file as text, unpacking .zip or .gz downloads on the fly."""
+    if path.endswith(".zip"):
+        archive = zipfile.ZipFile(path)
+        member = archive.open(archive.namelist()[0])
+        return io.TextIOWrapper(member, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+class _JSONStream:
+    """Incrementally decode values from a file without reading it whole."""
+
+    def __init__(self, f, chunk_size=1 << 16):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        # Drop what has been consumed so the buffer only holds the current value
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of bulk file")
+        self.pos += 1
+
+    def value(self):
+        """Decode one JSON value, reading more input until it is complete."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may be cut short; make sure
+            # something follows it before trusting the decode.
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_label_records(path):
+    """Yield label records from the top-level "results" array of a bulk file."""
+    with _open_text(path) as f:
+        stream = _JSONStream(f)
+        stream.expect("{")
+        while stream.peek() not in ("}", ""):
+            key = stream.value()
+            stream.expect(":")
+            if key != "results":
+                stream.value()  # "meta" is small, decode and discard it
+            else:
+                stream.expect("[")
+                while stream.peek() != "]":
+                    yield stream.value()
+                    if stream.peek() == ",":
+                        stream.pos += 1
+                stream.pos += 1
+            if stream.peek() == ",":
+                stream.pos += 1
+
+
+def _section(record, *fields):
+    """Join the text of the first label section present in the record."""
+    for field in fields:
+        if record.get(field):
+            return "\n".join(record[field])
+    return ""
+
+
+def _drug_names(record):
+    openfda = record.get("openfda", {})
+    names = openfda.get("generic_name", []) + openfda.get("brand_name", [])
+    return " ".join(dict.fromkeys(name.lower() for name in names))
+
+
+def _fts_terms(text):
+    """Quote each word so user input can't inject FTS5 query syntax."""
+    return " AND ".join(f'"{word}"' for word in re.findall(r"\w+", text.lower()))
+
+
+class LabelIndex:
+    """Full-text index of the warnings/contraindications label sections by drug."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._warned_empty = False
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS labels USING fts5("
+            "set_id UNINDEXED, drug, warnings, contraindications, "
+            "tokenize = 'porter unicode61')"
+        )
+
+    def load(self, path, batch_size=500):
+        """Stream a bulk file into the index; returns the number of labels stored."""
+        count = 0
+        batch = []
+        for record in iter_label_records(path):
+            drug = _drug_names(record)
+            if not drug:
+                continue
+            batch.append(
+                (
+                    record.get("set_id", record.get("id", "")),
+                    drug,
+                    _section(
+                        record, "warnings", "warnings_and_cautions", "boxed_warning"
+                    ),
+                    _section(record, "contraindications"),
+                )
+            )
+            if len(batch) >= batch_size:
+                count += self._insert(batch)
+                batch = []
+        count += self._insert(batch)
+        return count
+
+    def _insert(self, rows):
+        if not rows:
+            return 0
+        with self._lock:
+            # Replace earlier versions of the same label so reloads stay idempotent
+            self._conn.executemany(
+                "DELETE FROM labels WHERE set_id = ?", [(row[0],) for row in rows]
+            )
+            self._conn.executemany(
+                "INSERT INTO labels (set_id, drug, warnings, contraindications) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def optimize(self):
+        """Merge FTS5 segments after a bulk load for faster lookups."""
+        with self._lock:
+            self._conn.execute("INSERT INTO labels(labels) VALUES ('optimize')")
+            self._conn.commit()
+
+    def lookup(self, medication, condition):
+        """Return the warning text of the best label matching the drug and condition."""
+        drug_terms = _fts_terms(medication)
+        if not drug_terms:
+            return NO_DATA
+        query = f"drug : ({drug_terms})"
+        condition_terms = _fts_terms(condition)
+        if condition_terms:
+            query += f" AND {{warnings contraindications}} : ({condition_terms})"
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT warnings, contraindications FROM labels "
+                "WHERE labels MATCH ? ORDER BY rank LIMIT 1",
+                (query,),
+            ).fetchone()
+        if row is None:
+            if not self._warned_empty and len(self) == 0:
+                self._warned_empty = True
+                print(
+                    f"FDA label index at {self.path} is empty; "
+                    "load it with: python fda_label_index.py load <bulk file>"
+                )
+            return NO_DATA
+        # A label matched but carries neither section
+        return row[0] or row[1] or NO_WARNINGS
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+
+_index = None
+
+
+def get_index():
+    """Open the shared index on first use so API-only runs never touch the file."""
+    global _index
+    if _index is None:
+        _index = LabelIndex()
+    return _index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "load":
+        index = get_index()
+        for bulk_file in sys.argv[2:]:
+            start = time.perf_counter()
+            loaded = index.load(bulk_file)
+            print(f"{bulk_file}: {loaded} labels in {time.perf_counter() - start:.1f}s")
+        index.optimize()
+        print(f"Index {index.path} holds {len(index)} labels")
+    elif len(sys.argv) == 4 and sys.argv[1] == "query":
+        start = time.perf_counter()
+        result = get_index().lookup(sys.argv[2], sys.argv[3])
+        print(result)
+        print(f"({(time.perf_counter() - start) * 1000:.2f} ms)")
+    else:
+        print(__doc__)
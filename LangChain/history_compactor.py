@@ -0,0 +1,149 @@
+"""
+Background compaction of long chat histories
+Chat loops resend the whole history every turn, so long sessions get slow
+and expensive. HistoryCompactor watches a history after each turn; once it
+passes max_tokens, a worker thread summarizes everything but the most
+recent keep_tokens worth of turns and swaps the summary in with the
+history's atomic compact(). Messages added while the summary is being
+written are kept. The user-facing turn never waits: maybe_compact only
+counts tokens and queues the job, and a session is compacted by at most
+one worker at a time.
+Histories need a compact(count, replacement) method: session_store's
+StoredChatHistory has one, CompactingChatHistory adds it to the in-memory
+history.
+Author: tdiprima
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import HumanMessage, SystemMessage, get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from pydantic import PrivateAttr
+
+from prompt_budget import count_tokens
+
+MAX_TOKENS = int(os.getenv("COMPACT_TOKEN_LIMIT", "2000"))
+WORKERS = int(os.getenv("COMPACT_WORKERS", "2"))
+
+SUMMARY_PROMPT = PromptTemplate.from_template(
+    "Summarize the conversation below so the assistant can carry on without "
+    "it. Keep names, facts, user preferences and open questions; drop "
+    "pleasantries.\n\n{transcript}\n\nSummary:"
+)
+
+
+class CompactingChatHistory(InMemoryChatMessageHistory):
+    """In-memory chat history whose prefix can be swapped atomically."""
+
+    _lock: object = PrivateAttr(default_factory=threading.Lock)
+
+    def add_message(self, message):
+        with self._lock:
+            self.messages.append(message)
+
+    def compact(self, count, replacement):
+        """Replace the first count messages, e.g. with a summary."""
+        with self._lock:
+            self.messages = list(replacement) + self.messages[count:]
+
+
+class HistoryCompactor:
+    """Summarizes the older turns of oversized histories off the request path."""
+
+    def __init__(
+        self,
+        llm,
+        max_tokens=MAX_TOKENS,
+        keep_tokens=None,
+        workers=WORKERS,
+        verbose=False,
+    ):
+        self.chain = SUMMARY_PROMPT | llm | StrOutputParser()
+        self.max_tokens = max_tokens
+        self.keep_tokens = keep_tokens if keep_tokens is not None else max_tokens // 2
+        self.verbose = verbose
+        self.compactions = 0
+        self.failures = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="compactor"
+        )
+        self._running = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(history):
+        return getattr(history, "session_id", id(history))
+
+    def maybe_compact(self, history):
+        """Queue a compaction if the history is over budget; never blocks."""
+        if count_tokens(get_buffer_string(history.messages)) <= self.max_tokens:
+            return False
+        key = self._key(history)
+        with self._lock:
+            if key in self._running:
+                return False
+            self._running.add(key)
+        self._executor.submit(self._run, key, history)
+        return True
+
+    def on_messages(self, history, messages):
+        """SessionStore listener: check the session after every append."""
+        self.maybe_compact(history)
+
+    def _run(self, key, history):
+        try:
+            self.compact(history)
+        except Exception as e:
+            self.failures += 1
+            print(f"[compact] {key}: summary failed, history left as is ({e})")
+        finally:
+            with self._lock:
+                self._running.discard(key)
+
+    def _split(self, messages):
+        """Number of leading messages to summarize, ending before a human turn."""
+        kept = 0
+        cut = len(messages)
+        while cut > 0:
+            tokens = count_tokens(get_buffer_string([messages[cut - 1]]))
+            if kept + tokens > self.keep_tokens:
+                break
+            kept += tokens
+            cut -= 1
+        while cut < len(messages) and not isinstance(messages[cut], HumanMessage):
+            cut += 1
+        return cut
+
+    def compact(self, history):
+        """Summarize the history's older turns now and swap the summary in."""
+        start = time.perf_counter()
+        messages = history.messages
+        count = self._split(messages)
+        if count < 2:
+            return False
+        summary = self.chain.invoke({"transcript": get_buffer_string(messages[:count])})
+        history.compact(
+            count,
+            [SystemMessage(content=f"Summary of the conversation so far: {summary}")],
+        )
+        self.compactions += 1
+        if self.verbose:
+            print(
+                f"[compact] {self._key(history)}: {count} messages -> summary "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+        return True
+
+    def stats(self):
+        with self._lock:
+            running = len(self._running)
+        return {
+            "compactions": self.compactions,
+            "failures": self.failures,
+            "running": running,
+        }
@@ -0,0 +1,141 @@
+"""
+Shared HTTP layer with adaptive timeouts and hedged GET requests
+Tracks recent latency per host. Timeouts follow the observed p95 (times a safety
+multiplier), and when a GET is still outstanding after the host's p95 a duplicate
+is sent; whichever answers first wins. This trims tail latency from slow
+upstreams while adding only ~5% extra requests. Pass hedge=False for APIs
+that bill per request, such as SerpAPI.
+Author: tdiprima
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class AdaptiveHTTP:
+    """requests.Session wrapper with per-host p95 tracking, timeouts and hedging."""
+
+    def __init__(
+        self,
+        pool_size=16,
+        default_timeout=10.0,
+        min_timeout=2.0,
+        max_timeout=30.0,
+        timeout_multiplier=3.0,
+        window=200,
+        min_samples=20,
+        hedge=True,
+    ):
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.hedge = hedge
+        # One pooled session for every caller so connections are reused
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Room for a hedge alongside every primary request
+        self._executor = ThreadPoolExecutor(max_workers=pool_size * 2)
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    def p95(self, host):
+        """Return the host's p95 latency in seconds, or None until enough samples."""
+        with self._lock:
+            samples = sorted(self._latencies[host])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def timeout_for(self, host):
+        """Timeout for the next request to host, derived from its observed p95."""
+        p95 = self.p95(host)
+        if p95 is None:
+            return self.default_timeout
+        return min(
+            self.max_timeout, max(self.min_timeout, p95 * self.timeout_multiplier)
+        )
+
+    def _record(self, host, latency, outcome):
+        with self._lock:
+            self._latencies[host].append(latency)
+            self._counters[host][outcome] += 1
+
+    def _timed_get(self, host, url, timeout, kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, timeout=timeout, **kwargs)
+        except requests.Timeout:
+            # Count a timeout as a sample at the limit so p95 (and with it the
+            # timeout) can grow again when a host slows down.
+            self._record(host, timeout, "timeouts")
+            raise
+        self._record(host, time.perf_counter() - start, "requests")
+        return response
+
+    def get(self, url, timeout=None, hedge=None, **kwargs):
+        """GET url with an adaptive timeout, hedging once the host's p95 has passed.
+
+        Accepts the same keyword arguments as requests.get. Pass timeout to
+        override the adaptive value and hedge=False to disable the duplicate.
+        """
+        host = urlsplit(url).netloc
+        timeout = timeout or self.timeout_for(host)
+        hedge_after = (
+            self.p95(host) if (self.hedge if hedge is None else hedge) else None
+        )
+        if hedge_after is None:
+            return self._timed_get(host, url, timeout, kwargs)
+
+        pending = {self._executor.submit(self._timed_get, host, url, timeout, kwargs)}
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done:
+            with self._lock:
+                self._counters[host]["hedges"] += 1
+            pending.add(
+                self._executor.submit(self._timed_get, host, url, timeout, kwargs)
+            )
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # Release the loser's connection back to the pool when it lands
+                    for loser in pending:
+                        loser.add_done_callback(_close_response)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def stats(self):
+        """Per-host p95, current timeout and request/timeout/hedge counts."""
+        with self._lock:
+            counters = {host: dict(counts) for host, counts in self._counters.items()}
+        return {
+            host: {
+                "p95_s": self.p95(host),
+                "timeout_s": self.timeout_for(host),
+                **counts,
+            }
+            for host, counts in counters.items()
+        }
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+# Shared instance for the scripts in this directory
+http = AdaptiveHTTP(pool_size=int(os.getenv("HTTP_POOL_SIZE", "16")))
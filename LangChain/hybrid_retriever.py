@@ -0,0 +1,262 @@
+"""
+Hybrid BM25 + dense retrieval over a FAISS store
+Dense embeddings miss rare exact terms (drug names, lab tests such as
+"hypercalcemia") that a keyword index finds easily. BM25Index is a sparse
+inverted index over the FAISS docstore, precomputed once and saved next to the
+FAISS files as bm25.npz; every document's BM25 score for a query is summed
+from the postings in one NumPy pass. HybridRetriever merges the BM25 and FAISS
+rankings with reciprocal rank fusion (RRF); diversify=True adds near-duplicate
+removal and MMR re-ranking on top.
+Author: tdiprima
+"""
+
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from diversify import DiversifiedRetriever
+from vector_store import INDEX_ROOT, live_store, store_version
+
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 with per-posting weights computed at build time.
+
+    Postings are stored CSR-style: term t's documents are
+    doc_idx[indptr[t]:indptr[t + 1]] with matching weights, where each weight
+    is already idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avglen)).
+    """
+
+    def __init__(self, doc_ids, vocab, indptr, doc_idx, weights):
+        self.doc_ids = list(doc_ids)
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_idx = doc_idx
+        self.weights = weights
+
+    @classmethod
+    def build(cls, doc_ids, texts, k1=1.5, b=0.75):
+        term_freqs = []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[i] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            term_freqs.append(counts)
+        avg_len = float(lengths.mean()) if len(texts) else 0.0
+
+        postings = {}
+        for i, counts in enumerate(term_freqs):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((i, tf))
+
+        vocab = {term: t for t, term in enumerate(sorted(postings))}
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_idx, weights = [], []
+        n = len(texts)
+        for term, t in vocab.items():
+            docs, tfs = zip(*postings[term])
+            docs = np.array(docs, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = k1 * (1 - b + b * lengths[docs] / (avg_len or 1.0))
+            doc_idx.append(docs)
+            weights.append(idf * tfs * (k1 + 1) / (tfs + norm))
+            indptr[t + 1] = indptr[t] + len(docs)
+        return cls(
+            doc_ids,
+            vocab,
+            indptr,
+            np.concatenate(doc_idx) if doc_idx else np.zeros(0, dtype=np.int32),
+            (
+                np.concatenate(weights).astype(np.float32)
+                if weights
+                else np.zeros(0, dtype=np.float32)
+            ),
+        )
+
+    def scores(self, query):
+        """BM25 score of every document for query, as one float32 array."""
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        terms = [self.vocab[t] for t in set(tokenize(query)) if t in self.vocab]
+        if terms:
+            spans = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in terms]
+            postings = np.concatenate(spans)
+            np.add.at(scores, self.doc_idx[postings], self.weights[postings])
+        return scores
+
+    def search(self, query, k):
+        """Top-k (doc_id, score) pairs with a positive score, best first."""
+        scores = self.scores(query)
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top]
+
+    def save(self, path, fingerprint):
+        np.savez(
+            path,
+            indptr=self.indptr,
+            doc_idx=self.doc_idx,
+            weights=self.weights,
+            meta=np.array(
+                json.dumps(
+                    {
+                        "fingerprint": fingerprint,
+                        "doc_ids": self.doc_ids,
+                        "vocab": self.vocab,
+                    }
+                )
+            ),
+        )
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """Load a saved index, or None if it was built for other documents."""
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["fingerprint"] != fingerprint:
+                return None
+            return cls(
+                meta["doc_ids"],
+                meta["vocab"],
+                data["indptr"],
+                data["doc_idx"],
+                data["weights"],
+            )
+
+
+def docstore_fingerprint(doc_ids):
+    return hashlib.sha256("\0".join(doc_ids).encode()).hexdigest()
+
+
+def bm25_for(vector_db, name=None, index_root=INDEX_ROOT):
+    """BM25 index over vector_db's documents, cached beside its FAISS files."""
+    doc_ids = [doc_id for _, doc_id in sorted(vector_db.index_to_docstore_id.items())]
+    fingerprint = docstore_fingerprint(doc_ids)
+    path = Path(index_root) / name / "bm25.npz" if name else None
+    if path is not None and path.exists():
+        bm25 = BM25Index.load(path, fingerprint)
+        if bm25 is not None:
+            return bm25
+    texts = [vector_db.docstore.search(doc_id).page_content for doc_id in doc_ids]
+    bm25 = BM25Index.build(doc_ids, texts)
+    if path is not None and path.parent.exists():
+        bm25.save(path, fingerprint)
+    return bm25
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked lists of IDs; returns (ids, scores) sorted best first.
+
+    Each list contributes 1 / (k + rank) for every ID it contains.
+    """
+    ids = list(dict.fromkeys(id_ for ranking in rankings for id_ in ranking))
+    if not ids:
+        return [], np.zeros(0)
+    position = {id_: i for i, id_ in enumerate(ids)}
+    fused = np.zeros(len(ids))
+    for ranking in rankings:
+        where = np.fromiter((position[id_] for id_ in ranking), dtype=np.int64)
+        fused[where] += 1.0 / (k + np.arange(1, len(ranking) + 1))
+    order = np.argsort(-fused, kind="stable")
+    return [ids[i] for i in order], fused[order]
+
+
+class HybridRetriever(BaseRetriever):
+    """Top-k documents by RRF over BM25 and FAISS similarity rankings."""
+
+    vector_store: object
+    """A FAISS store, or an IncrementalIndex to follow its upserts and compactions."""
+    bm25: object = None
+    """BM25Index over the store as it is now; rebuilt whenever the store changes."""
+    name: str | None = None
+    """Saved index name, so rebuilt BM25 indexes are cached beside it."""
+    index_root: str = INDEX_ROOT
+    k: int = 4
+    fetch_k: int = 20
+    """Candidates taken from each ranking before fusion."""
+    rrf_k: int = 60
+
+    _bm25_key: object = PrivateAttr(default=None)
+    _lock: object = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context):
+        if self.bm25 is not None:
+            self._bm25_key = self._store_key(live_store(self.vector_store))
+
+    @staticmethod
+    def _store_key(store):
+        return id(store), store_version(store), len(store.index_to_docstore_id)
+
+    def _current(self):
+        """The live FAISS store and a BM25 index matching its contents."""
+        store = live_store(self.vector_store)
+        key = self._store_key(store)
+        with self._lock:
+            if self._bm25_key != key:
+                self.bm25 = bm25_for(store, self.name, self.index_root)
+                self._bm25_key = key
+            return store, self.bm25
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        store, bm25 = self._current()
+        deleted = getattr(store, "deleted_ids", set())
+        dense = [
+            doc.id
+            for doc, _ in store.similarity_search_with_score(query, k=self.fetch_k)
+        ]
+        sparse = [
+            doc_id
+            for doc_id, _ in bm25.search(query, self.fetch_k + len(deleted))
+            if doc_id not in deleted
+        ]
+        ids, _ = reciprocal_rank_fusion([dense, sparse], k=self.rrf_k)
+        return [store.docstore.search(id_) for id_ in ids[: self.k]]
+
+
+def hybrid_retriever(
+    vector_db, name, index_root=INDEX_ROOT, k=4, diversify=False, **kwargs
+):
+    """HybridRetriever for a store from vector_store.load_or_build(..., name).
+
+    vector_db may also be the IncrementalIndex itself, so searches follow its
+    upserts, deletes and compactions. With diversify, the fused top fetch_k are
+    deduplicated and re-ranked with MMR down to k (see
+    diversify.DiversifiedRetriever).
+    """
+    store = live_store(vector_db)
+    options = {
+        "vector_store": vector_db,
+        "bm25": bm25_for(store, name, index_root),
+        "name": name,
+        "index_root": index_root,
+        **kwargs,
+    }
+    if not diversify:
+        return HybridRetriever(k=k, **options)
+    candidates = HybridRetriever(**options)
+    candidates.k = candidates.fetch_k
+    return DiversifiedRetriever(
+        retriever=candidates,
+        embeddings=store.embedding_function,
+        k=k,
+        vector_store=vector_db,
+    )
@@ -0,0 +1,210 @@
+"""
+Bulk document ingestion into a saved FAISS index
+Streams files from one or more directories, splits them into chunks in a
+process pool, groups the chunks into token-sized embedding batches and embeds
+several batches at once. Each batch is written into the index as soon as its
+vectors arrive, so only a bounded number of files and batches are held in
+memory at a time regardless of corpus size. Chunks already in the index are
+skipped, and chunks from files that changed or disappeared are deleted.
+
+Usage:
+    python ingest.py                      # the markdown under docs/, Tutorial/docs, Tutorial1/docs
+    python ingest.py notes/ --name notes --batch-tokens 4000 --concurrency 2
+
+Load the result with vector_store.load_index(INDEX_ROOT / name, embeddings).
+Note: Requires OPENAI_API_KEY
+Author: tdiprima
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from prompt_budget import count_tokens
+from vector_store import INDEX_ROOT, IncrementalIndex, document_id
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_DIRS = [HERE / "docs", HERE / "Tutorial" / "docs", HERE / "Tutorial1" / "docs"]
+# OpenAI accepts up to 8191 tokens per input and ~300k per embeddings request
+BATCH_TOKENS = int(os.getenv("INGEST_BATCH_TOKENS", "8000"))
+CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))
+
+
+def iter_files(dirs, pattern="*.md"):
+    """Yield matching files under each directory, one at a time."""
+    for directory in dirs:
+        for path in sorted(Path(directory).rglob(pattern)):
+            if path.is_file():
+                yield path
+
+
+def chunk_file(path, chunk_size=1000, chunk_overlap=100):
+    """Split one file into Documents; runs in a worker process."""
+    splitter = RecursiveCharacterTextSplitter.from_language(
+        "markdown", chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    text = Path(path).read_text(encoding="utf-8", errors="replace")
+    return [
+        Document(page_content=chunk, metadata={"source": str(path), "chunk": i})
+        for i, chunk in enumerate(splitter.split_text(text))
+    ]
+
+
+def iter_chunks(paths, workers=None, **split_kwargs):
+    """Chunk files in a process pool, keeping only a few files in flight."""
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = []
+        for path in paths:
+            in_flight.append(pool.submit(chunk_file, path, **split_kwargs))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.pop(0).result()
+        for future in in_flight:
+            yield from future.result()
+
+
+def token_batches(chunks, max_tokens=BATCH_TOKENS):
+    """Group chunks into lists whose total token count stays under max_tokens."""
+    batch, batch_tokens = [], 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk.page_content)
+        if batch and batch_tokens + tokens > max_tokens:
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def ingest(
+    dirs,
+    embeddings,
+    name="docs",
+    index_root=INDEX_ROOT,
+    pattern="*.md",
+    batch_tokens=BATCH_TOKENS,
+    concurrency=CONCURRENCY,
+    workers=None,
+    report_every=10,
+):
+    """Embed every chunk under dirs that the index doesn't already hold.
+
+    At most `concurrency` embedding requests are in flight; each finished
+    batch goes straight into the index. Returns a stats dict.
+    """
+    index = IncrementalIndex(name, embeddings, index_root=index_root)
+    existing = index.ids()
+    seen = set()
+    stats = {"files": 0, "chunks": 0, "skipped": 0, "embedded": 0, "batches": 0}
+    start = time.perf_counter()
+
+    def counted(paths):
+        for path in paths:
+            stats["files"] += 1
+            yield path
+
+    def new_chunks():
+        for chunk in iter_chunks(counted(iter_files(dirs, pattern)), workers):
+            doc_id = document_id(chunk)
+            stats["chunks"] += 1
+            if doc_id in seen or doc_id in existing:
+                stats["skipped"] += 1
+            else:
+                yield chunk
+            seen.add(doc_id)
+
+    def embed(batch):
+        return batch, embeddings.embed_documents([c.page_content for c in batch])
+
+    def store(future):
+        batch, vectors = future.result()
+        index.add_embedded(batch, vectors)
+        stats["embedded"] += len(batch)
+        stats["batches"] += 1
+        if stats["batches"] % report_every == 0:
+            print(f"[progress] {_throughput(stats, start)}", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = set()
+        for batch in token_batches(new_chunks(), batch_tokens):
+            if len(in_flight) >= concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    store(future)
+            in_flight.add(pool.submit(embed, batch))
+        for future in in_flight:
+            store(future)
+
+    stats["deleted"] = index.delete(existing - seen)
+    index.save()
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    print(f"Ingested into {index.folder}: {_throughput(stats, start)}")
+    return stats
+
+
+def _throughput(stats, start):
+    elapsed = time.perf_counter() - start
+    rate = stats["chunks"] / elapsed if elapsed else 0.0
+    return (
+        f"{stats['files']} files, {stats['chunks']} chunks "
+        f"({stats['embedded']} embedded, {stats['skipped']} unchanged) "
+        f"in {elapsed:.1f}s = {rate:.1f} chunks/sec"
+    )
+
+
+if __name__ == "__main__":
+    from langchain_openai import OpenAIEmbeddings
+
+    from embedding_cache import CachedEmbeddings
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "dirs", nargs="*", default=DEFAULT_DIRS, help="directories to ingest"
+    )
+    parser.add_argument("--name", default="docs", help="index name (default: docs)")
+    parser.add_argument("--pattern", default="*.md", help="file glob (default: *.md)")
+    parser.add_argument(
+        "--batch-tokens",
+        type=int,
+        default=BATCH_TOKENS,
+        help="tokens per embedding request (default: INGEST_BATCH_TOKENS)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENCY,
+        help="embedding requests in flight (default: INGEST_CONCURRENCY)",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="chunking processes (default: CPU count)"
+    )
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key is None:
+        raise ValueError("OpenAI API key is not set.")
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(api_key=api_key, model="text-embedding-ada-002")
+    )
+    ingest(
+        args.dirs,
+        embeddings,
+        name=args.name,
+        pattern=args.pattern,
+        batch_tokens=args.batch_tokens,
+        concurrency=args.concurrency,
+        workers=args.workers,
+    )
+    print(f"Embedding cache: {embeddings.stats()}")
@@ -0,0 +1,206 @@
+"""
+Persistent exact-match cache for LLM responses
+SQLiteLLMCache is a LangChain BaseCache: every ChatOpenAI / OpenAI call made
+while it is installed first looks up sha256(model + parameters + serialized
+messages) and only calls the API on a miss. Responses sampled at a nonzero
+temperature are not cached unless force=True, since replaying them would
+hide the variation the caller asked for. Entries expire after a TTL and are
+evicted least-recently-used past max_entries.
+
+Opt-in: every entry script calls setup_llm_cache(), which does nothing unless
+LLM_CACHE=1 is set (LLM_CACHE_FORCE=1 also caches nonzero temperatures).
+LLM_CACHE_PATH, LLM_CACHE_TTL and LLM_CACHE_MAX_ENTRIES tune the store.
+Author: tdiprima
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from langchain_core.caches import BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+DEFAULT_PATH = os.getenv(
+    "LLM_CACHE_PATH", os.path.expanduser("~/.cache/langchain-lab/llm_cache.sqlite3")
+)
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))  # 30 days
+DEFAULT_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+_TEMPERATURE = re.compile(r"""["']temperature["']\s*[:,]\s*([-+0-9.eE]+)""")
+
+
+def temperature_of(llm_string):
+    """Temperature recorded in LangChain's llm_string, or None if unset."""
+    match = _TEMPERATURE.search(llm_string)
+    return float(match.group(1)) if match else None
+
+
+def dump_generations(generations):
+    return json.dumps(
+        [
+            {
+                "text": g.text,
+                "info": g.generation_info,
+                "message": (
+                    message_to_dict(g.message)
+                    if isinstance(g, ChatGeneration)
+                    else None
+                ),
+            }
+            for g in generations
+        ]
+    )
+
+
+def load_generations(value):
+    return [
+        (
+            ChatGeneration(
+                message=messages_from_dict([g["message"]])[0],
+                generation_info=g["info"],
+            )
+            if g["message"]
+            else Generation(text=g["text"], generation_info=g["info"])
+        )
+        for g in json.loads(value)
+    ]
+
+
+class SQLiteLLMCache(BaseCache):
+    """SQLite-backed TTL + LRU cache of LLM generations."""
+
+    def __init__(
+        self,
+        path=DEFAULT_PATH,
+        ttl=DEFAULT_TTL,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        force=False,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Agents and map steps call the model from worker threads
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed)"
+        )
+        self._conn.commit()
+
+    def _cacheable(self, llm_string):
+        # An unset temperature means the provider default, which samples
+        return self.force or temperature_of(llm_string) == 0
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode()).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        """Cached generations for prompt under llm_string, or None."""
+        if not self._cacheable(llm_string):
+            self.skipped += 1
+            return None
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return load_generations(row[0])
+
+    def update(self, prompt, llm_string, return_val):
+        """Store generations and evict the least recently used entries over the cap."""
+        if not self._cacheable(llm_string):
+            return
+        key = self._key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, dump_generations(return_val), now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self, **kwargs):
+        """Drop every cached entry and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self.hits = self.misses = self.skipped = 0
+
+    def stats(self):
+        """Hit/miss counters, calls skipped for temperature, and entry count."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+def llm_cache_enabled():
+    """True when LLM_CACHE asks for the response cache."""
+    return os.getenv("LLM_CACHE", "0").lower() in ("1", "true", "yes", "on")
+
+
+def setup_llm_cache(enabled=None, force=None, report=True, **kwargs):
+    """Install a SQLiteLLMCache for every model in this process.
+
+    enabled and force default to the LLM_CACHE and LLM_CACHE_FORCE environment
+    variables. Returns the cache, or None when caching is off. With report,
+    the cache stats are printed when the script exits.
+    """
+    if enabled is None:
+        enabled = llm_cache_enabled()
+    if not enabled:
+        return None
+    if force is None:
+        force = os.getenv("LLM_CACHE_FORCE", "0").lower() in ("1", "true", "yes", "on")
+    cache = SQLiteLLMCache(force=force, **kwargs)
+    set_llm_cache(cache)
+    if report:
+        atexit.register(lambda: print(f"LLM cache: {cache.stats()}"))
+    return cache
@@ -0,0 +1,219 @@
+"""
+Vector-retrieved long-term memory for chat sessions
+Instead of resending the whole transcript, a turn's prompt gets the last
+window messages plus the k earlier turns most similar to the new input.
+Every finished turn (human message + reply) is queued and a background
+thread embeds the queue in batches, across sessions, into a per-session
+vector index (normalized float32 rows, searched with one matrix product).
+Vectors persist in SQLite; indexes of the most recently used sessions stay
+in memory and others are loaded lazily. Recalled turns are truncated to
+turn_tokens, so the prompt stays the same size however long the session.
+Author: tdiprima
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from prompt_budget import truncate_tokens
+
+DEFAULT_PATH = os.getenv(
+    "LTM_PATH", os.path.expanduser("~/.cache/langchain-lab/long_term_memory.sqlite3")
+)
+WINDOW = int(os.getenv("LTM_WINDOW", "6"))
+TOP_K = int(os.getenv("LTM_K", "3"))
+BATCH_SIZE = int(os.getenv("LTM_BATCH_SIZE", "16"))
+BATCH_WAIT = float(os.getenv("LTM_BATCH_WAIT", "0.05"))
+TURN_TOKENS = int(os.getenv("LTM_TURN_TOKENS", "300"))
+MAX_SESSIONS = int(os.getenv("LTM_CACHE_SESSIONS", "1000"))
+
+
+def turn_text(human, ai):
+    return f"Human: {human}\nAI: {ai}"
+
+
+class LongTermMemory:
+    """Per-session vector index of past turns, filled by a batching worker."""
+
+    def __init__(
+        self,
+        embeddings,
+        path=DEFAULT_PATH,
+        window=WINDOW,
+        k=TOP_K,
+        batch_size=BATCH_SIZE,
+        batch_wait=BATCH_WAIT,
+        turn_tokens=TURN_TOKENS,
+        max_sessions=MAX_SESSIONS,
+    ):
+        self.embeddings = embeddings
+        self.window = window
+        self.k = k
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.turn_tokens = turn_tokens
+        self.max_sessions = max_sessions
+        self.embedded = 0
+        self.batches = 0
+        self.failures = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                human TEXT NOT NULL,
+                ai TEXT NOT NULL,
+                vector BLOB NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id)"
+        )
+        self._conn.commit()
+        # session_id -> (vectors, [(human, ai), ...]) for recently used sessions
+        self._sessions = OrderedDict()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def remember(self, session_id, human, ai):
+        """Queue a finished turn for embedding; returns immediately."""
+        self._queue.put((session_id, human, ai))
+
+    def on_messages(self, history, messages):
+        """SessionStore listener: remember each human/AI pair as it is saved."""
+        for human, ai in zip(messages, messages[1:]):
+            if isinstance(human, HumanMessage) and isinstance(ai, AIMessage):
+                self.remember(history.session_id, human.content, ai.content)
+
+    def _worker(self):
+        while True:
+            batch = [self._queue.get()]
+            # Linger briefly so turns finishing together share one request
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(
+                        self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                    )
+                except queue.Empty:
+                    break
+            try:
+                self._store(batch)
+            except Exception as e:
+                self.failures += 1
+                print(f"[memory] could not embed {len(batch)} turns: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _store(self, batch):
+        vectors = np.asarray(
+            self.embeddings.embed_documents([turn_text(h, a) for _, h, a in batch]),
+            dtype=np.float32,
+        )
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO turns (session_id, human, ai, vector) VALUES (?, ?, ?, ?)",
+                [
+                    (session_id, human, ai, vector.tobytes())
+                    for (session_id, human, ai), vector in zip(batch, vectors)
+                ],
+            )
+            self._conn.commit()
+            for (session_id, human, ai), vector in zip(batch, vectors):
+                cached = self._sessions.get(session_id)
+                if cached is not None:
+                    self._sessions[session_id] = (
+                        np.vstack([cached[0], vector]) if cached[1] else vector[None],
+                        cached[1] + [(human, ai)],
+                    )
+            self.embedded += len(batch)
+            self.batches += 1
+
+    def _index(self, session_id):
+        """The session's (vectors, turns), loading it from SQLite if needed."""
+        with self._lock:
+            cached = self._sessions.get(session_id)
+            if cached is not None:
+                self._sessions.move_to_end(session_id)
+                return cached
+            rows = self._conn.execute(
+                "SELECT human, ai, vector FROM turns WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+            vectors = (
+                np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+                if rows
+                else np.zeros((0, 0), dtype=np.float32)
+            )
+            cached = (vectors, [(human, ai) for human, ai, _ in rows])
+            self._sessions[session_id] = cached
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return cached
+
+    def recall(self, session_id, query, exclude=()):
+        """Up to k past (human, ai) turns most similar to query, oldest first.
+
+        Turns whose human message is in exclude (e.g. already in the recent
+        window) are skipped.
+        """
+        vectors, turns = self._index(session_id)
+        exclude = set(exclude)
+        candidates = [i for i, (human, _) in enumerate(turns) if human not in exclude]
+        if not candidates or self.k <= 0:
+            return []  # skip embedding the query when there is nothing to find
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        scores = vectors[candidates] @ (
+            query_vector / max(np.linalg.norm(query_vector), 1e-12)
+        )
+        best = np.argsort(-scores)[: self.k]
+        return [turns[candidates[i]] for i in sorted(best)]
+
+    def build_history(self, session_id, messages, query):
+        """Messages for the next prompt: recalled turns plus the recent window.
+
+        A leading summary left by HistoryCompactor is kept in front.
+        """
+        messages = list(messages)
+        head = (
+            messages[:1] if messages and isinstance(messages[0], SystemMessage) else []
+        )
+        recent = messages[len(head) :][-self.window :] if self.window > 0 else []
+        while recent and not isinstance(recent[0], HumanMessage):
+            recent = recent[1:]
+        recalled = self.recall(
+            session_id,
+            query,
+            exclude=[m.content for m in recent if isinstance(m, HumanMessage)],
+        )
+        if recalled:
+            memory = "\n\n".join(
+                truncate_tokens(turn_text(human, ai), self.turn_tokens)
+                for human, ai in recalled
+            )
+            head = head + [
+                SystemMessage(content=f"Relevant earlier conversation:\n{memory}")
+            ]
+        return head + recent
+
+    def flush(self):
+        """Block until every queued turn has been embedded."""
+        self._queue.join()
+
+    def stats(self):
+        return {
+            "embedded_turns": self.embedded,
+            "batches": self.batches,
+            "queued": self._queue.qsize(),
+            "failures": self.failures,
+        }
@@ -0,0 +1,147 @@
+"""
+Retrieval QA that switches between "stuff" and parallel map-reduce
+"stuff" puts every retrieved document into one prompt, which stops working
+once k or the documents grow past the context window. AdaptiveRetrievalQA
+counts the retrieved tokens first: if they fit stuff_token_limit it stuffs as
+usual, otherwise it runs one extraction prompt per document concurrently
+(max_workers at a time) and combines the extracts in a reduce step,
+collapsing them in parallel rounds if they still don't fit.
+Replaces RetrievalQA.from_chain_type in spy_agent_rag.py; invoke({"query": q})
+returns {"result": ...} as before, plus the mode used and its timings.
+Author: tdiprima
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.chains.base import Chain
+from langchain_core.callbacks import CallbackManagerForChainRun
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.retrievers import BaseRetriever
+
+from prompt_budget import PROMPT_TOKEN_BUDGET, count_tokens, truncate_tokens
+
+STUFF_TOKEN_LIMIT = PROMPT_TOKEN_BUDGET
+MAX_WORKERS = int(os.getenv("QA_MAX_WORKERS", "8"))
+
+ANSWER_PROMPT = PromptTemplate.from_template(
+    "Use the following pieces of context to answer the question at the end. "
+    "If you don't know the answer, just say that you don't know, don't try to "
+    "make up an answer.\n\n{context}\n\nQuestion: {question}\nHelpful Answer:"
+)
+MAP_PROMPT = PromptTemplate.from_template(
+    "Use the following portion of a long document to see if any of the text is "
+    "relevant to answer the question. Return any relevant text verbatim. If "
+    "nothing is relevant, reply with exactly NONE.\n\n{context}\n\n"
+    "Question: {question}\nRelevant text, if any:"
+)
+COLLAPSE_PROMPT = PromptTemplate.from_template(
+    "Condense the following extracts into the facts that help answer the "
+    "question, keeping names and numbers exact.\n\n{context}\n\n"
+    "Question: {question}\nCondensed facts:"
+)
+
+
+class AdaptiveRetrievalQA(Chain):
+    """Stuff when the documents fit, parallel map-reduce when they don't."""
+
+    llm: BaseLanguageModel
+    retriever: BaseRetriever
+    stuff_token_limit: int = STUFF_TOKEN_LIMIT
+    """Most context tokens one prompt may carry."""
+    max_workers: int = MAX_WORKERS
+    """Extraction prompts in flight at once during the map step."""
+    max_collapse_rounds: int = 3
+    """After this many rounds whatever is left is truncated to fit."""
+    input_key: str = "query"
+    output_key: str = "result"
+
+    @property
+    def input_keys(self):
+        return [self.input_key]
+
+    @property
+    def output_keys(self):
+        return [self.output_key, "mode", "timings"]
+
+    def _run_prompts(self, prompt, contexts, question, run_manager):
+        """One LLM call per context, up to max_workers concurrently."""
+        chain = prompt | self.llm | StrOutputParser()
+        config = {"callbacks": run_manager.get_child()}
+        # A thread per call rather than chain.batch: completion-style LLMs
+        # batch by running their prompts one after another
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            return list(
+                pool.map(
+                    lambda context: chain.invoke(
+                        {"context": context, "question": question}, config=config
+                    ),
+                    contexts,
+                )
+            )
+
+    def _pack(self, texts):
+        """Group texts into joined contexts of at most stuff_token_limit tokens."""
+        groups, current, current_tokens = [], [], 0
+        for text in texts:
+            text = truncate_tokens(text, self.stuff_token_limit)
+            tokens = count_tokens(text)
+            if current and current_tokens + tokens > self.stuff_token_limit:
+                groups.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            groups.append("\n\n".join(current))
+        return groups
+
+    def _call(self, inputs, run_manager: CallbackManagerForChainRun = None):
+        run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        question = inputs[self.input_key]
+        timings = {}
+        start = time.perf_counter()
+        docs = self.retriever.invoke(
+            question, config={"callbacks": run_manager.get_child()}
+        )
+        texts = [doc.page_content for doc in docs]
+        timings["retrieve_s"] = round(time.perf_counter() - start, 3)
+
+        context_tokens = sum(count_tokens(text) for text in texts)
+        mode = "stuff" if context_tokens <= self.stuff_token_limit else "map_reduce"
+        if mode == "map_reduce":
+            start = time.perf_counter()
+            texts = [truncate_tokens(text, self.stuff_token_limit) for text in texts]
+            extracts = self._run_prompts(MAP_PROMPT, texts, question, run_manager)
+            texts = [e for e in extracts if e.strip() and e.strip() != "NONE"]
+            timings["map_s"] = round(time.perf_counter() - start, 3)
+            # Collapse in parallel rounds until the extracts fit one prompt
+            start = time.perf_counter()
+            groups = self._pack(texts)
+            for _ in range(self.max_collapse_rounds):
+                if len(groups) <= 1:
+                    break
+                texts = self._run_prompts(
+                    COLLAPSE_PROMPT, groups, question, run_manager
+                )
+                groups = self._pack(texts)
+            texts = [truncate_tokens("\n\n".join(groups), self.stuff_token_limit)]
+            timings["collapse_s"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        answer = self._run_prompts(
+            ANSWER_PROMPT, ["\n\n".join(texts)], question, run_manager
+        )[0]
+        timings["answer_s"] = round(time.perf_counter() - start, 3)
+        if self.verbose:
+            print(
+                f"[qa] {len(docs)} docs, {context_tokens} context tokens -> {mode} "
+                f"{timings}"
+            )
+        return {self.output_key: answer, "mode": mode, "timings": timings}
+
+    @property
+    def _chain_type(self):
+        return "adaptive_retrieval_qa"
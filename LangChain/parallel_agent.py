@@ -0,0 +1,190 @@
+"""
+Parallel tool execution for tools agents
+ParallelAgentExecutor is a drop-in AgentExecutor that runs every tool call the
+model issues in one turn at the same time: sync tools in a thread pool, tools
+with an async implementation on a shared event loop. Observations come back in
+the order the model asked for them, and each step's latency is broken down into
+planning time, per-tool time and tool wall time.
+Author: tdiprima
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.tools import BaseTool, StructuredTool, Tool
+from pydantic import PrivateAttr
+
+
+def has_async_impl(tool):
+    """True when the tool brings its own coroutine instead of wrapping _run."""
+    if isinstance(tool, (Tool, StructuredTool)):
+        return tool.coroutine is not None
+    return type(tool)._arun is not BaseTool._arun
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """AgentExecutor that runs all tool calls from one model turn concurrently."""
+
+    max_workers: int = 8
+    """Thread pool size for sync tools."""
+    step_timings: list = []
+    """One latency breakdown per step of the latest run, appended as steps finish."""
+
+    _futures: dict = PrivateAttr(default_factory=dict)
+    _actions: list = PrivateAttr(default_factory=list)
+    _timing: dict = PrivateAttr(default_factory=dict)
+    _loop: object = PrivateAttr(default=None)
+
+    def _start_step(self, intermediate_steps):
+        # A run's first step: start a fresh list so long sessions don't grow it
+        if not intermediate_steps:
+            self.step_timings = []
+        self._actions = []
+        self._futures = {}
+        self._timing = {"start": time.perf_counter(), "plan_s": None, "tools": []}
+
+    def _note_action(self, item):
+        if self._timing["plan_s"] is None:
+            self._timing["plan_s"] = time.perf_counter() - self._timing["start"]
+        self._actions.append(item)
+
+    def _finish_step(self):
+        timing = self._timing
+        if not self._actions:
+            return
+        tools_start = timing["start"] + timing["plan_s"]
+        entry = {
+            "plan_s": round(timing["plan_s"], 3),
+            "tools_wall_s": round(time.perf_counter() - tools_start, 3),
+            "tools": timing["tools"],
+        }
+        self.step_timings.append(entry)
+        if self.verbose:
+            per_tool = ", ".join(f"{name} {secs:.2f}s" for name, secs in entry["tools"])
+            print(
+                f"\n[step {len(self.step_timings)}] plan {entry['plan_s']:.2f}s, "
+                f"tools {entry['tools_wall_s']:.2f}s wall ({per_tool})"
+            )
+
+    def _timed(self, func, agent_action, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._timing["tools"].append(
+                (agent_action.tool, round(time.perf_counter() - start, 3))
+            )
+
+    def _event_loop(self):
+        """Shared loop in a daemon thread that hosts every async tool call."""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return self._loop
+
+    async def _arun_tool(self, tool, color, agent_action, run_manager):
+        tool_run_kwargs = self._action_agent.tool_run_logging_kwargs()
+        if tool.return_direct:
+            tool_run_kwargs["llm_prefix"] = ""
+        start = time.perf_counter()
+        observation = await tool.arun(
+            agent_action.tool_input,
+            verbose=self.verbose,
+            color=color,
+            callbacks=run_manager.get_child() if run_manager else None,
+            **tool_run_kwargs,
+        )
+        self._timing["tools"].append(
+            (agent_action.tool, round(time.perf_counter() - start, 3))
+        )
+        return AgentStep(action=agent_action, observation=observation)
+
+    def _submit_all(self, name_to_tool_map, color_mapping, run_manager):
+        """Start every action of the current step at once."""
+        pool = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(self._actions)))
+        )
+        perform = super()._perform_agent_action
+        for action in self._actions:
+            tool = name_to_tool_map.get(action.tool)
+            if tool is not None and has_async_impl(tool):
+                if run_manager:
+                    run_manager.on_agent_action(action, color="green")
+                coro = self._arun_tool(
+                    tool, color_mapping[action.tool], action, run_manager
+                )
+                future = asyncio.run_coroutine_threadsafe(coro, self._event_loop())
+            else:
+                future = pool.submit(
+                    self._timed,
+                    perform,
+                    action,
+                    name_to_tool_map,
+                    color_mapping,
+                    action,
+                    run_manager,
+                )
+            self._futures[id(action)] = future
+        pool.shutdown(wait=False)
+
+    def _perform_agent_action(
+        self, name_to_tool_map, color_mapping, agent_action, run_manager=None
+    ):
+        # AgentExecutor yields every action of a step before performing the
+        # first one, so on the first call all of them are known and can be
+        # started together; each call then waits for its own result in order.
+        if id(agent_action) not in self._futures:
+            self._submit_all(name_to_tool_map, color_mapping, run_manager)
+        return self._futures.pop(id(agent_action)).result()
+
+    def _iter_next_step(
+        self,
+        name_to_tool_map,
+        color_mapping,
+        inputs,
+        intermediate_steps,
+        run_manager=None,
+    ):
+        self._start_step(intermediate_steps)
+        for item in super()._iter_next_step(
+            name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+        ):
+            if isinstance(item, AgentAction):
+                self._note_action(item)
+            yield item
+        self._finish_step()
+
+    async def _aiter_next_step(
+        self,
+        name_to_tool_map,
+        color_mapping,
+        inputs,
+        intermediate_steps,
+        run_manager=None,
+    ):
+        # The async executor already gathers a step's tool calls concurrently;
+        # this only adds the latency breakdown.
+        self._start_step(intermediate_steps)
+        async for item in super()._aiter_next_step(
+            name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+        ):
+            if isinstance(item, AgentAction):
+                self._note_action(item)
+            yield item
+        self._finish_step()
+
+    async def _aperform_agent_action(
+        self, name_to_tool_map, color_mapping, agent_action, run_manager=None
+    ):
+        start = time.perf_counter()
+        step = await super()._aperform_agent_action(
+            name_to_tool_map, color_mapping, agent_action, run_manager
+        )
+        self._timing["tools"].append(
+            (agent_action.tool, round(time.perf_counter() - start, 3))
+        )
+        return step
@@ -0,0 +1,129 @@
+"""
+Token-budgeted prompt assembly
+Counts tokens with the local tiktoken tokenizer, ranks pieces of evidence and
+truncates or drops the least relevant ones so a prompt fits a token budget.
+PROMPT_TOKEN_BUDGET is the default budget for every script that has one.
+Author: tdiprima
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # without it, estimate ~4 characters per token
+    tiktoken = None
+
+TRUNCATION_MARK = " [...]"
+# Default prompt budget shared by every script that reads PROMPT_TOKEN_BUDGET
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    """tiktoken encoding for model, or None when it can't be loaded."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # BPE files download on first use, which fails offline
+        return None
+
+
+def count_tokens(text, model="gpt-4"):
+    """Number of tokens text takes up for the given model."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text, max_tokens, model="gpt-4"):
+    """Cut text down to at most max_tokens tokens, marking the cut."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        if len(text) <= max_tokens * 4:
+            return text
+        return text[: max_tokens * 4] + TRUNCATION_MARK
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + TRUNCATION_MARK
+
+
+def relevance(text, query):
+    """Fraction of the query's words that appear in text (0.0 - 1.0)."""
+    query_words = set(re.findall(r"\w+", query.lower()))
+    if not query_words:
+        return 0.0
+    return len(query_words & set(re.findall(r"\w+", text.lower()))) / len(query_words)
+
+
+@dataclass
+class Evidence:
+    """One piece of prompt context; higher score means more worth keeping."""
+
+    key: str
+    text: str
+    score: float = 0.0
+
+
+def fit_to_budget(pieces, budget, model="gpt-4", min_tokens=32):
+    """Keep the highest-scoring pieces that fit in budget tokens.
+
+    First every piece that fits whole is admitted best-first, so one long
+    label can't crowd out several short ones. The pieces left over are then
+    truncated best-first into the remaining space while at least min_tokens
+    remain, and the rest are dropped.
+    Returns (kept, report): kept preserves the input order, and report holds
+    tokens_in, tokens_out, tokens_saved plus the keys truncated or dropped.
+    """
+    counts = [count_tokens(piece.text, model) for piece in pieces]
+    ranked = sorted(range(len(pieces)), key=lambda i: pieces[i].score, reverse=True)
+    remaining = budget
+    kept = {}
+    overflow = []
+    for i in ranked:
+        if counts[i] <= remaining:
+            kept[i] = pieces[i]
+            remaining -= counts[i]
+        else:
+            overflow.append(i)
+    truncated, dropped = [], []
+    mark_tokens = count_tokens(TRUNCATION_MARK, model)
+    for i in overflow:
+        piece = pieces[i]
+        if remaining >= min_tokens:
+            text = truncate_tokens(piece.text, remaining - mark_tokens, model)
+            kept[i] = Evidence(piece.key, text, piece.score)
+            remaining -= count_tokens(text, model)
+            truncated.append(piece.key)
+        else:
+            dropped.append(piece.key)
+    tokens_in = sum(counts)
+    tokens_out = budget - remaining
+    report = {
+        "budget": budget,
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_saved": tokens_in - tokens_out,
+        "truncated": truncated,
+        "dropped": dropped,
+    }
+    return [kept[i] for i in sorted(kept)], report
+
+
+def format_report(report):
+    """One-line summary of a fit_to_budget report."""
+    return (
+        f"Prompt budget: {report['tokens_out']}/{report['budget']} tokens used, "
+        f"{report['tokens_saved']} saved ({len(report['truncated'])} truncated, "
+        f"{len(report['dropped'])} dropped)"
+    )
@@ -0,0 +1,103 @@
+"""
+In-process cache for retriever results
+A ReAct agent often calls its retrieval tool several times in one loop with
+the same or nearly the same query, and each call re-embeds the query and
+searches the index again. CachedRetriever answers repeats from an LRU cache
+with a TTL, keyed by the normalized query and the index version, and drops
+everything once the index version changes.
+Author: tdiprima
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "256"))
+DEFAULT_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+
+
+def normalize_query(query):
+    """Lower-case, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", str(query).lower()).split())
+
+
+class CachedRetriever(BaseRetriever):
+    """Wraps a retriever with an LRU + TTL cache of its results."""
+
+    retriever: BaseRetriever
+    version: Callable[[], object] = lambda: 0
+    """Returns the index version; a new value invalidates every entry."""
+    max_entries: int = DEFAULT_MAX_ENTRIES
+    ttl: float = DEFAULT_TTL
+
+    _entries: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: object = PrivateAttr(default_factory=threading.Lock)
+    _version: object = PrivateAttr(default=None)
+    _counts: dict = PrivateAttr(
+        default_factory=lambda: dict.fromkeys(
+            ("hits", "misses", "evictions", "expirations", "invalidations"), 0
+        )
+    )
+
+    def _lookup(self, key, version):
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self._counts["invalidations"] += 1
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self._counts["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counts["hits"] += 1
+            return entry[1]
+
+    def _store(self, key, version, docs):
+        with self._lock:
+            if version != self._version:  # the index changed during the search
+                return
+            self._entries[key] = (time.monotonic(), docs)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        key = normalize_query(query)
+        version = self.version()
+        docs = self._lookup(key, version)
+        if docs is None:
+            docs = self.retriever.invoke(
+                query, config={"callbacks": run_manager.get_child()}
+            )
+            self._store(key, version, docs)
+        return list(docs)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss/eviction counters, hit rate and current size."""
+        with self._lock:
+            counts = dict(self._counts)
+            counts["size"] = len(self._entries)
+        total = counts["hits"] + counts["misses"]
+        counts["hit_rate"] = counts["hits"] / total if total else 0.0
+        return counts
@@ -0,0 +1,210 @@
+"""
+Semantic answer cache for retrieval QA chains
+People ask the same question in many phrasings ("Tell me about the nuclear
+codes" / "where are the nuclear codes kept"). SemanticQACache embeds each
+query and looks up the most similar previously answered queries in a small
+FAISS inner-product index. A cached answer is reused only when the cosine
+similarity clears the threshold and the retriever returns exactly the same
+documents as when it was answered. Documents are identified by content hash,
+so an edited document no longer matches and its answers are recomputed;
+invalidate_documents() and retain() drop such entries eagerly.
+Entries persist in SQLite so answers survive restarts.
+Author: tdiprima
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import faiss
+import numpy as np
+from langchain.chains.base import Chain
+from langchain_core.callbacks import CallbackManagerForChainRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+from vector_store import document_id, embedding_model_id
+
+DEFAULT_PATH = os.getenv(
+    "SEMANTIC_CACHE_PATH",
+    os.path.expanduser("~/.cache/langchain-lab/semantic_qa.sqlite3"),
+)
+DEFAULT_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+
+class SemanticQACache(Chain):
+    """Answers near-duplicate questions over unchanged documents from a cache."""
+
+    chain: Chain
+    """The QA chain to call on a miss, e.g. AdaptiveRetrievalQA."""
+    retriever: BaseRetriever
+    """Must return what the chain retrieves; share a CachedRetriever to avoid searching twice."""
+    embeddings: Embeddings
+    threshold: float = DEFAULT_THRESHOLD
+    """Minimum cosine similarity between the new and a cached query."""
+    candidates: int = 5
+    """Nearest cached queries checked for a matching document set."""
+    max_entries: int = DEFAULT_MAX_ENTRIES
+    path: str = DEFAULT_PATH
+
+    _conn: object = PrivateAttr(default=None)
+    _index: object = PrivateAttr(default=None)
+    _lock: object = PrivateAttr(default_factory=threading.Lock)
+    _counts: dict = PrivateAttr(
+        default_factory=lambda: {"hits": 0, "misses": 0, "invalidated": 0}
+    )
+
+    def model_post_init(self, __context):
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS qa_cache (
+                id INTEGER PRIMARY KEY,
+                model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                doc_ids TEXT NOT NULL,
+                outputs TEXT NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT id, vector FROM qa_cache WHERE model = ?", (self._model,)
+        ).fetchall()
+        for row_id, blob in rows:
+            self._add_vector(row_id, np.frombuffer(blob, dtype=np.float32))
+
+    @property
+    def _model(self):
+        return embedding_model_id(self.embeddings)
+
+    @property
+    def input_keys(self):
+        return self.chain.input_keys
+
+    @property
+    def output_keys(self):
+        return self.chain.output_keys + ["cache"]
+
+    def _add_vector(self, row_id, vector):
+        if self._index is None:
+            self._index = faiss.IndexIDMap(faiss.IndexFlatIP(len(vector)))
+        self._index.add_with_ids(
+            vector.reshape(1, -1), np.array([row_id], dtype=np.int64)
+        )
+
+    def _remove(self, row_ids):
+        if not row_ids:
+            return
+        self._index.remove_ids(np.array(row_ids, dtype=np.int64))
+        self._conn.executemany(
+            "DELETE FROM qa_cache WHERE id = ?", [(i,) for i in row_ids]
+        )
+        self._conn.commit()
+
+    def _lookup(self, vector, doc_ids):
+        """Best cached (outputs, similarity) for this query and document set."""
+        if self._index is None or self._index.ntotal == 0:
+            return None, 0.0
+        scores, ids = self._index.search(vector.reshape(1, -1), self.candidates)
+        best = float(scores[0][0]) if ids[0][0] >= 0 else 0.0
+        for score, row_id in zip(scores[0], ids[0]):
+            if row_id < 0 or score < self.threshold:
+                break
+            row = self._conn.execute(
+                "SELECT doc_ids, outputs FROM qa_cache WHERE id = ?", (int(row_id),)
+            ).fetchone()
+            if row and json.loads(row[0]) == doc_ids:
+                self._conn.execute(
+                    "UPDATE qa_cache SET accessed = ? WHERE id = ?",
+                    (time.time(), int(row_id)),
+                )
+                self._conn.commit()
+                return json.loads(row[1]), float(score)
+        return None, best
+
+    def _store(self, query, vector, doc_ids, outputs):
+        cursor = self._conn.execute(
+            "INSERT INTO qa_cache (model, query, vector, doc_ids, outputs, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                self._model,
+                query,
+                vector.tobytes(),
+                json.dumps(doc_ids),
+                json.dumps(outputs, default=str),
+                time.time(),
+            ),
+        )
+        self._conn.commit()
+        self._add_vector(cursor.lastrowid, vector)
+        count = self._index.ntotal
+        if count > self.max_entries:
+            oldest = self._conn.execute(
+                "SELECT id FROM qa_cache WHERE model = ? ORDER BY accessed LIMIT ?",
+                (self._model, count - self.max_entries),
+            ).fetchall()
+            self._remove([row_id for (row_id,) in oldest])
+
+    def _call(self, inputs, run_manager: CallbackManagerForChainRun = None):
+        run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        query = inputs[self.chain.input_keys[0]]
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        vector /= max(np.linalg.norm(vector), 1e-12)
+        docs = self.retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        doc_ids = sorted(document_id(doc) for doc in docs)
+
+        with self._lock:
+            outputs, similarity = self._lookup(vector, doc_ids)
+        if outputs is not None:
+            self._counts["hits"] += 1
+            return {**outputs, "cache": {"hit": True, "similarity": similarity}}
+
+        self._counts["misses"] += 1
+        result = self.chain.invoke(
+            inputs, config={"callbacks": run_manager.get_child()}
+        )
+        outputs = {key: result[key] for key in self.chain.output_keys}
+        with self._lock:
+            self._store(query, vector, doc_ids, outputs)
+        return {**outputs, "cache": {"hit": False, "similarity": similarity}}
+
+    def _drop_where(self, stale_if):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, doc_ids FROM qa_cache WHERE model = ?", (self._model,)
+            ).fetchall()
+            stale = [row_id for row_id, docs in rows if stale_if(set(json.loads(docs)))]
+            self._remove(stale)
+            self._counts["invalidated"] += len(stale)
+        return len(stale)
+
+    def invalidate_documents(self, ids):
+        """Drop cached answers that were based on any of the given document IDs."""
+        ids = set(ids)
+        return self._drop_where(lambda docs: bool(docs & ids))
+
+    def retain(self, live_ids):
+        """Drop cached answers citing a document that is no longer in the index."""
+        live_ids = set(live_ids)
+        return self._drop_where(lambda docs: not docs <= live_ids)
+
+    def stats(self):
+        """Hit/miss counters, hit rate and the number of cached answers."""
+        total = self._counts["hits"] + self._counts["misses"]
+        return {
+            **self._counts,
+            "hit_rate": self._counts["hits"] / total if total else 0.0,
+            "entries": self._index.ntotal if self._index is not None else 0,
+        }
+
+    @property
+    def _chain_type(self):
+        return "semantic_qa_cache"
@@ -0,0 +1,180 @@
+"""
+Durable chat session store with a bounded in-memory working set
+SessionStore hands RunnableWithMessageHistory a history per session_id. The
+most recently used max_sessions histories stay in an in-memory LRU; every
+new message is also appended to a SQLite log as it arrives, so evicting a
+cold session costs nothing and nothing is lost when the process exits.
+A session that is not in memory is loaded lazily from the log the next
+time it is asked for, which keeps RAM flat at 100k+ sessions. Listeners
+see every append; with a HistoryCompactor listening, long sessions have
+their older turns swapped for a summary in the background.
+Author: tdiprima
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+DEFAULT_PATH = os.getenv(
+    "SESSION_DB_PATH", os.path.expanduser("~/.cache/langchain-lab/sessions.sqlite3")
+)
+DEFAULT_MAX_SESSIONS = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+
+
+class StoredChatHistory(BaseChatMessageHistory):
+    """One session's messages, written through to its SessionStore."""
+
+    def __init__(self, session_id, store, messages=None):
+        self.session_id = session_id
+        self._store = store
+        self._messages = list(messages or [])
+
+    @property
+    def messages(self):
+        return list(self._messages)
+
+    def add_messages(self, messages):
+        messages = list(messages)
+        with self._store.lock:
+            self._store.append(self.session_id, messages)
+            self._messages.extend(messages)
+        for listener in self._store.listeners:
+            listener(self, messages)
+
+    def compact(self, count, replacement):
+        """Atomically replace the first count messages, e.g. with a summary."""
+        with self._store.lock:
+            self._store.replace_prefix(self.session_id, count, replacement)
+            self._messages[:count] = replacement
+            # If this copy was evicted and the session reloaded meanwhile,
+            # refresh the live copy from the log
+            current = self._store._sessions.get(self.session_id)
+            if current is not None and current is not self:
+                current._messages = self._store._load(self.session_id)
+
+    def clear(self):
+        with self._store.lock:
+            self._store.delete(self.session_id)
+            self._messages = []
+
+
+class SessionStore:
+    """LRU of hot chat histories over an append-only SQLite message log."""
+
+    def __init__(
+        self, path=DEFAULT_PATH, max_sessions=DEFAULT_MAX_SESSIONS, listeners=()
+    ):
+        self.path = path
+        self.max_sessions = max_sessions
+        # Called as listener(history, messages) after every append, e.g.
+        # HistoryCompactor.on_messages or LongTermMemory.on_messages
+        self.listeners = list(listeners)
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._sessions = OrderedDict()
+        # Reentrant: histories hold it around their own calls into the store
+        self.lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Each append is its own transaction; WAL makes NORMAL crash-safe
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                message TEXT NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)"
+        )
+        self._conn.commit()
+
+    def _load(self, session_id):
+        rows = self._conn.execute(
+            "SELECT message FROM messages WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        ).fetchall()
+        return messages_from_dict([json.loads(message) for (message,) in rows])
+
+    def get(self, session_id):
+        """The session's history, loaded from disk if it is not in memory."""
+        with self.lock:
+            history = self._sessions.get(session_id)
+            if history is not None:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+                return history
+            history = StoredChatHistory(session_id, self, self._load(session_id))
+            self.loads += 1
+            self._sessions[session_id] = history
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            return history
+
+    def append(self, session_id, messages):
+        """Append messages to the session's log."""
+        with self.lock:
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, message) VALUES (?, ?)",
+                [(session_id, json.dumps(message_to_dict(m))) for m in messages],
+            )
+            self._conn.commit()
+
+    def replace_prefix(self, session_id, count, replacement):
+        """Swap the session's first count logged messages for fewer new ones."""
+        if len(replacement) > count:
+            raise ValueError("replacement must not be longer than the prefix")
+        with self.lock:
+            ids = [
+                row_id
+                for (row_id,) in self._conn.execute(
+                    "SELECT id FROM messages WHERE session_id = ? ORDER BY id LIMIT ?",
+                    (session_id, count),
+                )
+            ]
+            self._conn.executemany(
+                "DELETE FROM messages WHERE id = ?", [(i,) for i in ids]
+            )
+            # Reuse the highest freed ids so the replacement still sorts first
+            self._conn.executemany(
+                "INSERT INTO messages (id, session_id, message) VALUES (?, ?, ?)",
+                [
+                    (row_id, session_id, json.dumps(message_to_dict(m)))
+                    for row_id, m in zip(
+                        ids[len(ids) - len(replacement) :], replacement
+                    )
+                ],
+            )
+            self._conn.commit()
+
+    def delete(self, session_id):
+        """Forget a session in memory and on disk."""
+        with self.lock:
+            self._sessions.pop(session_id, None)
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id = ?", (session_id,)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """Cache hits, lazy loads, evictions and hot/total session counts."""
+        with self.lock:
+            total = self._conn.execute(
+                "SELECT COUNT(DISTINCT session_id) FROM messages"
+            ).fetchone()[0]
+            hot = len(self._sessions)
+        return {
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "hot_sessions": hot,
+            "stored_sessions": total,
+        }
@@ -7,12 +7,20 @@ Author: tdiprima
 
 import os
 
-from langchain.chains import RetrievalQA
-from langchain_community.vectorstores.faiss import FAISS
 from langchain_core.documents.base import Document
 # from langchain_core.documents import Document
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
+from diversify import DiversifiedRetriever
+from embedding_cache import CachedEmbeddings
+from llm_cache import setup_llm_cache
+from map_reduce_qa import AdaptiveRetrievalQA
+from retrieval_cache import CachedRetriever
+from semantic_cache import SemanticQACache
+from vector_store import load_or_build, store_version
+
+setup_llm_cache()
+
 api_key = os.getenv("OPENAI_API_KEY")  # Returns None if not set
 
 if api_key is None:
@@ -34,20 +42,30 @@ documents = [
 # Convert text into vector embeddings
 # Initialize embeddings with retry parameters to handle newer SDK correctly
 try:
-    embeddings = OpenAIEmbeddings(
-        api_key=api_key, model="text-embedding-ada-002", max_retries=5
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(api_key=api_key, model="text-embedding-ada-002", max_retries=5)
     )
     print("Embeddings initialized successfully!")
 except Exception as e:
     print(f"Error initializing OpenAIEmbeddings: {e}")
 
 try:
-    vector_db = FAISS.from_documents(documents, embeddings)
+    vector_db = load_or_build(documents, embeddings, "spy")
     print("FAISS database initialized successfully!")
 except Exception as e:
     print(f"Error initializing FAISS: {e}")
 
-retriever = vector_db.as_retriever()
+# Over-fetch, drop near-duplicate chunks, then pick a diverse top 4 with MMR.
+# Cached so the semantic cache and the QA chain share one search per query.
+retriever = CachedRetriever(
+    retriever=DiversifiedRetriever(
+        retriever=vector_db.as_retriever(search_kwargs={"k": 20}),
+        embeddings=embeddings,
+        k=4,
+        vector_store=vector_db,
+    ),
+    version=lambda: store_version(vector_db),
+)
 
 query = "Where is Agent X?"
 retrieved_docs = retriever.invoke(query)
@@ -55,8 +73,23 @@ retrieved_docs = retriever.invoke(query)
 for doc in retrieved_docs:
     print(doc.page_content)  # Output: "Agent X was last seen in Paris."
 
-# "stuff" directly appends retrieved data
-qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, chain_type="stuff")
 
-response = qa_chain.invoke({"query": "Tell me about the nuclear codes."})
-print(response["result"])  # AI will generate a response based on retrieved data.
+# Stuff the documents when they fit in PROMPT_TOKEN_BUDGET tokens, otherwise
+# extract from each one in parallel (QA_MAX_WORKERS) and reduce the extracts
+qa_chain = AdaptiveRetrievalQA(llm=llm, retriever=retriever, verbose=True)
+
+# Reuse answers to rephrased questions (SEMANTIC_CACHE_THRESHOLD) as long as
+# they retrieve the same documents; forget answers citing removed documents
+cached_qa = SemanticQACache(chain=qa_chain, retriever=retriever, embeddings=embeddings)
+cached_qa.retain(vector_db.index_to_docstore_id.values())
+
+for question in [
+    "Tell me about the nuclear codes.",
+    "Where are the nuclear codes kept?",
+]:
+    response = cached_qa.invoke({"query": question})
+    print(response["result"])  # AI will generate a response based on retrieved data.
+    print(f"Answer mode: {response['mode']} {response['timings']}")
+    print(f"Semantic cache: {response['cache']}")
+print(f"Semantic cache: {cached_qa.stats()}")
+print(f"Embedding cache: {embeddings.stats()}")
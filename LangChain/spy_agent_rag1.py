@@ -8,13 +8,20 @@ Author: tdiprima
 
 import os
 
-import requests
 from langchain.agents import initialize_agent
 from langchain.tools import tool
-from langchain_community.vectorstores.faiss import FAISS
 from langchain_core.documents import Document
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
+from embedding_cache import CachedEmbeddings
+from http_client import http
+from hybrid_retriever import hybrid_retriever
+from llm_cache import setup_llm_cache
+from retrieval_cache import CachedRetriever
+from vector_store import load_or_build, store_version
+
+setup_llm_cache()
+
 # Load API key
 api_key = os.getenv("OPENAI_API_KEY")
 if api_key is None:
@@ -33,9 +40,16 @@ documents = [
         page_content="The formula for the secret serum is stored on a secure server."
     ),
 ]
-embeddings = OpenAIEmbeddings(api_key=api_key, model="text-embedding-ada-002")
-vector_db = FAISS.from_documents(documents, embeddings)
-retriever = vector_db.as_retriever()
+embeddings = CachedEmbeddings(
+    OpenAIEmbeddings(api_key=api_key, model="text-embedding-ada-002")
+)
+vector_db = load_or_build(documents, embeddings, "spy")
+# BM25 + dense with rank fusion, so exact terms like agent codenames still match.
+# Repeated lookups within one agent run are answered from an in-memory cache.
+retriever = CachedRetriever(
+    retriever=hybrid_retriever(vector_db, "spy"),
+    version=lambda: store_version(vector_db),
+)
 
 
 # Tool: Retrieve intelligence data
@@ -53,7 +67,7 @@ def fetch_spy_network_update(agent_name: str):
     try:
         # Simulated API call
         url = f"https://fake-spy-network-api.com/agent?name={agent_name}"
-        response = requests.get(url)
+        response = http.get(url)
         if response.status_code == 200:
             return response.json()
         return {"error": "Could not retrieve spy network data."}
@@ -74,3 +88,5 @@ agent = initialize_agent(
 query = "Where is Agent X and what is his mission?"
 response = agent.invoke({"input": query, "chat_history": []})
 print(response["output"])
+print(f"Embedding cache: {embeddings.stats()}")
+print(f"Retrieval cache: {retriever.stats()}")
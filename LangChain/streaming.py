@@ -0,0 +1,148 @@
+"""
+Token streaming for the interactive chat loops
+TokenStream prints model tokens as they arrive and measures each turn's
+time-to-first-token (TTFT) and generation rate in tokens/sec. Feed it from
+Runnable.stream (print_stream), from an agent executor's astream_events
+(stream_agent / astream_agent), or attach it as a callback to a legacy
+chain whose model has streaming=True. Chat history is left to the caller,
+which commits it once the turn has finished.
+Streaming is on by default; set CHAT_STREAM=0 to wait for whole replies.
+Runnable.stream and astream_events never read or write the LLM cache, so
+with LLM_CACHE=1 streaming is off unless CHAT_STREAM=1 asks for it.
+Author: tdiprima
+"""
+
+import asyncio
+import os
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from llm_cache import llm_cache_enabled
+from prompt_budget import count_tokens
+
+_stream = os.getenv("CHAT_STREAM", "0" if llm_cache_enabled() else "1")
+STREAMING = _stream.lower() not in ("0", "false", "no", "off")
+_warned_cache = False
+
+
+def _warn_cache_bypass():
+    """Say once that streamed replies skip an enabled LLM cache."""
+    global _warned_cache
+    if llm_cache_enabled() and not _warned_cache:
+        _warned_cache = True
+        print("[stream] streamed replies bypass the LLM cache; CHAT_STREAM=0 uses it")
+
+
+class TokenStream(BaseCallbackHandler):
+    """Prints streamed text as it arrives and times the turn."""
+
+    def __init__(self, prefix="AI: "):
+        self.prefix = prefix
+        self.start = time.perf_counter()
+        self.first = None
+        self.end = None
+        self.parts = []
+        self._open_line = False
+
+    def add(self, text):
+        if not text:
+            return
+        if self.first is None:
+            self.first = time.perf_counter()
+            print(self.prefix, end="", flush=True)
+        self.parts.append(text)
+        self._open_line = True
+        print(text, end="", flush=True)
+
+    def end_line(self):
+        """Finish the streamed line so other output starts on a new one."""
+        if self._open_line:
+            print(flush=True)
+            self._open_line = False
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.add(token)
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def stats(self):
+        """TTFT, output tokens and tokens/sec after the first token."""
+        end = self.end or time.perf_counter()
+        if self.first is None:
+            return {"ttft_s": None, "tokens": 0, "tokens_per_s": None}
+        tokens = count_tokens(self.text)
+        generation = end - self.first
+        return {
+            "ttft_s": round(self.first - self.start, 3),
+            "tokens": tokens,
+            "tokens_per_s": round(tokens / generation, 1) if generation > 0 else None,
+            "total_s": round(end - self.start, 3),
+        }
+
+    def finish(self):
+        """End the streamed line and print the turn's timings."""
+        self.end = time.perf_counter()
+        self.end_line()
+        stats = self.stats()
+        if stats["ttft_s"] is not None:
+            print(
+                f"[stream] ttft {stats['ttft_s']:.2f}s, {stats['tokens']} tokens, "
+                f"{stats['tokens_per_s']} tok/s"
+            )
+        return stats
+
+
+def print_stream(chunks, prefix="AI: "):
+    """Print message chunks from Runnable.stream; returns the TokenStream."""
+    _warn_cache_bypass()
+    stream = TokenStream(prefix)
+    for chunk in chunks:
+        stream.add(chunk.content)
+    stream.finish()
+    return stream
+
+
+async def astream_agent(executor, inputs, prefix="Assistant: "):
+    """Run an AgentExecutor with astream_events, printing the answer's tokens.
+
+    Only text content is printed, so tool-call planning stays silent. Returns
+    the executor's final output dict and the TokenStream.
+    """
+    _warn_cache_bypass()
+    stream = TokenStream(prefix)
+    output = None
+    async for event in executor.astream_events(inputs, version="v2"):
+        if event["event"] == "on_chat_model_stream":
+            content = event["data"]["chunk"].content
+            stream.add(content if isinstance(content, str) else "")
+        elif event["event"] == "on_chat_model_end":
+            # The verbose executor logs right after each model call
+            stream.end_line()
+        elif event["event"] == "on_chain_end" and not event["parent_ids"]:
+            output = event["data"]["output"]
+    stream.finish()
+    return output, stream
+
+
+_loop = None
+
+
+def stream_agent(executor, inputs, prefix="Assistant: "):
+    """Blocking astream_agent for sync chat loops.
+
+    Every turn runs on the same event loop so the model's async HTTP client
+    and its pooled connections stay usable between turns.
+    """
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    result = _loop.run_until_complete(astream_agent(executor, inputs, prefix))
+    # Let the closing of the executor's inner streams finish before the loop
+    # goes idle until the next turn
+    pending = asyncio.all_tasks(_loop)
+    if pending:
+        _loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+    return result
@@ -0,0 +1,69 @@
+"""
+Token-bounded conversational memory
+TokenBudgetMemory keeps the most recent turns verbatim up to max_token_limit
+tokens and folds older turns into a rolling LLM summary, so prompt size stays
+flat over a long session. Unlike ConversationSummaryBufferMemory, which
+re-tokenizes the whole buffer after every message it drops, each message is
+tokenized once and its count cached.
+Drop-in for ConversationBufferMemory in diabetes.py and Tutorial1/memory_chat.py.
+Author: tdiprima
+"""
+
+from langchain.memory import ConversationSummaryBufferMemory
+from langchain_core.messages import HumanMessage, get_buffer_string
+from pydantic import PrivateAttr
+
+from prompt_budget import count_tokens
+
+
+class TokenBudgetMemory(ConversationSummaryBufferMemory):
+    """Recent turns verbatim within a token budget, older turns summarized."""
+
+    _token_counts: list = PrivateAttr(default_factory=list)
+
+    def _message_tokens(self):
+        """Per-message token counts, tokenizing only messages not seen before."""
+        buffer = self.chat_memory.messages
+        if len(self._token_counts) > len(buffer):  # history was cleared elsewhere
+            self._token_counts = []
+        for message in buffer[len(self._token_counts) :]:
+            self._token_counts.append(count_tokens(get_buffer_string([message])))
+        return self._token_counts
+
+    def _pop_old_turns(self):
+        """Drop the oldest whole turns until the buffer fits; returns what was dropped."""
+        buffer = self.chat_memory.messages
+        counts = self._message_tokens()
+        total = sum(counts)
+        pruned = []
+        while buffer and (
+            total > self.max_token_limit
+            or (pruned and not isinstance(buffer[0], HumanMessage))
+        ):
+            pruned.append(buffer.pop(0))
+            total -= counts.pop(0)
+        return pruned
+
+    def prune(self) -> None:
+        """Fold turns beyond the token budget into the running summary."""
+        pruned = self._pop_old_turns()
+        if pruned:
+            self.moving_summary_buffer = self.predict_new_summary(
+                pruned, self.moving_summary_buffer
+            )
+
+    async def aprune(self) -> None:
+        """Async version of prune."""
+        pruned = self._pop_old_turns()
+        if pruned:
+            self.moving_summary_buffer = await self.apredict_new_summary(
+                pruned, self.moving_summary_buffer
+            )
+
+    def clear(self) -> None:
+        super().clear()
+        self._token_counts = []
+
+    async def aclear(self) -> None:
+        await super().aclear()
+        self._token_counts = []
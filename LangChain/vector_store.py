@@ -0,0 +1,575 @@
+"""
+FAISS index manager for the RAG scripts
+Saves the FAISS index and docstore to disk together with a fingerprint of the
+corpus contents and the embedding model. Later starts load the saved index
+(memory-mapped where FAISS supports it) instead of re-embedding everything
+through the API. When the corpus changes, IncrementalIndex embeds only the new
+or changed documents and deletes the removed ones, keyed by content-hash IDs.
+
+FAISS_INDEX_TYPE picks the index structure: flat (exact, the default), ivf,
+hnsw, ivfsq (IVF + 8-bit scalar quantization) or ivfpq (IVF + product
+quantization, the smallest). Approximate indexes are trained on a sample of
+the vectors; FAISS_NPROBE and FAISS_EF_SEARCH trade speed for recall.
+
+Usage:
+    python vector_store.py benchmark spy --k 10 --nprobe 8
+Author: tdiprima
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores.faiss import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+INDEX_ROOT = os.getenv(
+    "FAISS_INDEX_DIR", os.path.expanduser("~/.cache/langchain-lab/faiss")
+)
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+TRAIN_SIZE = int(os.getenv("FAISS_TRAIN_SIZE", "100000"))
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfsq", "ivfpq")
+# Every TombstoneFAISS change takes a fresh number, so caches can key on it
+_versions = itertools.count(1)
+# Fewest vectors each type can be trained on (PQ needs one per 256 centroids)
+MIN_TRAINING = {"flat": 0, "hnsw": 0, "ivf": 39, "ivfsq": 39, "ivfpq": 256}
+
+
+def embedding_model_id(embeddings):
+    """Identify the embedding model, e.g. 'OpenAIEmbeddings:text-embedding-ada-002'."""
+    # Look through wrappers such as CachedEmbeddings, which don't change the vectors
+    while isinstance(getattr(embeddings, "embeddings", None), Embeddings):
+        embeddings = embeddings.embeddings
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", "")
+    return f"{type(embeddings).__name__}:{model}"
+
+
+def corpus_fingerprint(documents, embeddings, index_type="flat"):
+    """sha256 over the embedding model, index type and every document."""
+    digest = hashlib.sha256(embedding_model_id(embeddings).encode())
+    if index_type != "flat":
+        digest.update(index_type.encode())
+    for doc in documents:
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode())
+        digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def document_id(doc):
+    """Stable ID for a document: sha256 of its text and metadata."""
+    digest = hashlib.sha256(doc.page_content.encode())
+    digest.update(b"\0")
+    digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class TombstoneFAISS(FAISS):
+    """FAISS store with deferred deletes.
+
+    Deleted IDs stay in the index but are hidden from search results until
+    compacted() rebuilds the index without them, so a delete is O(1) instead of
+    shifting every vector after it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deleted_ids = set()
+        self.version = next(_versions)
+
+    def add_embeddings(self, *args, **kwargs):
+        ids = super().add_embeddings(*args, **kwargs)
+        self.version = next(_versions)
+        return ids
+
+    def mark_deleted(self, ids):
+        self.deleted_ids |= set(ids)
+        self.version = next(_versions)
+
+    def restore(self, ids):
+        """Un-delete ids whose vectors are still in the index."""
+        self.deleted_ids -= set(ids)
+        self.version = next(_versions)
+
+    def live_ids(self):
+        return set(self.index_to_docstore_id.values()) - self.deleted_ids
+
+    def _drop_deleted(self, docs_and_scores):
+        return [pair for pair in docs_and_scores if pair[0].id not in self.deleted_ids]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding, k=4, filter=None, fetch_k=20, **kwargs
+    ):
+        extra = len(self.deleted_ids)
+        docs = super().similarity_search_with_score_by_vector(
+            embedding, k + extra, filter=filter, fetch_k=fetch_k + extra, **kwargs
+        )
+        return self._drop_deleted(docs)[:k]
+
+    def max_marginal_relevance_search_with_score_by_vector(
+        self, embedding, *, k=4, fetch_k=20, lambda_mult=0.5, filter=None
+    ):
+        extra = len(self.deleted_ids)
+        docs = super().max_marginal_relevance_search_with_score_by_vector(
+            embedding,
+            k=k + extra,
+            fetch_k=fetch_k + extra,
+            lambda_mult=lambda_mult,
+            filter=filter,
+        )
+        return self._drop_deleted(docs)[:k]
+
+    def compacted(self):
+        """Return a copy of this store with the deleted vectors physically removed."""
+        live = [
+            (i, id_)
+            for i, id_ in sorted(self.index_to_docstore_id.items())
+            if id_ not in self.deleted_ids
+        ]
+        # Re-adding reconstructed vectors to an emptied clone keeps any
+        # training and search parameters and works for every index type
+        index = faiss.clone_index(self.index)
+        index.reset()
+        positions = np.array([i for i, _ in live], dtype=np.int64)
+        for start in range(0, len(positions), 10_000):
+            index.add(reconstruct(self.index, positions[start : start + 10_000]))
+        docstore = InMemoryDocstore({id_: self.docstore.search(id_) for _, id_ in live})
+        return TombstoneFAISS(
+            self.embedding_function,
+            index,
+            docstore,
+            {n: id_ for n, (_, id_) in enumerate(live)},
+            normalize_L2=self._normalize_L2,
+            distance_strategy=self.distance_strategy,
+        )
+
+
+def store_version(vector_db):
+    """Changes whenever vector_db's contents do; 0 for a plain read-only FAISS."""
+    return getattr(vector_db, "version", 0)
+
+
+def live_store(source):
+    """The FAISS store an IncrementalIndex currently serves, or source itself."""
+    return getattr(source, "vector_db", source)
+
+
+def reconstruct(index, positions):
+    """Stored vectors at positions (decoded, so approximate for quantized indexes)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_batch(positions)
+
+
+def index_kind(index):
+    """The INDEX_TYPES name of a FAISS index."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return "ivfsq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def factory_key(index_type, dim, n):
+    """faiss.index_factory description for index_type sized for n vectors."""
+    # ~4*sqrt(n) inverted lists, with at least 39 training points per list
+    nlist = max(1, min(int(4 * n**0.5), n // 39))
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivfsq":
+        return f"IVF{nlist},SQ8"
+    if index_type == "ivfpq":
+        # Up to 64 one-byte codes per vector, each covering at least 4 dims
+        m = next(
+            m
+            for m in (64, 48, 32, 24, 16, 8, 4, 2, 1)
+            if dim % m == 0 and dim // m >= min(4, dim)
+        )
+        return f"IVF{nlist},PQ{m}"
+    if index_type == "hnsw":
+        return "HNSW32"
+    return "Flat"
+
+
+def set_search_params(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    """Apply nprobe (IVF lists visited) or efSearch (HNSW candidate list)."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW) and ef_search:
+        index.hnsw.efSearch = ef_search
+
+
+def index_memory_bytes(index):
+    """Serialized size of the index, a close proxy for its resident memory."""
+    return faiss.serialize_index(index).nbytes
+
+
+def build_ann_index(
+    source,
+    index_type,
+    train_size=TRAIN_SIZE,
+    nprobe=NPROBE,
+    ef_search=EF_SEARCH,
+    batch_size=10_000,
+):
+    """Copy a FAISS index into a new one of index_type, trained on a sample.
+
+    Vectors are read back from source in batches, so peak memory is the sample
+    plus one batch on top of the two indexes. Returns None when there are too
+    few vectors to train the requested type.
+    """
+    n, dim = source.ntotal, source.d
+    if n < MIN_TRAINING[index_type]:
+        return None
+    index = faiss.index_factory(
+        dim, factory_key(index_type, dim, n), source.metric_type
+    )
+    if not index.is_trained:
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(n, size=min(n, train_size), replace=False))
+        index.train(reconstruct(source, sample.astype(np.int64)))
+    for start in range(0, n, batch_size):
+        index.add(reconstruct(source, np.arange(start, min(n, start + batch_size))))
+    set_search_params(index, nprobe, ef_search)
+    return index
+
+
+def convert_store(vector_db, index_type, **kwargs):
+    """vector_db with its index rebuilt as index_type (see build_ann_index)."""
+    index = build_ann_index(vector_db.index, index_type, **kwargs)
+    if index is None:
+        print(
+            f"{vector_db.index.ntotal} vectors are too few for {index_type}; kept flat"
+        )
+        return vector_db
+    converted = TombstoneFAISS(
+        vector_db.embedding_function,
+        index,
+        vector_db.docstore,
+        dict(vector_db.index_to_docstore_id),
+        normalize_L2=vector_db._normalize_L2,
+        distance_strategy=vector_db.distance_strategy,
+    )
+    converted.deleted_ids = set(getattr(vector_db, "deleted_ids", ()))
+    return converted
+
+
+def recall_at_k(exact_index, index, queries, k=10):
+    """Mean fraction of the exact top-k that index also returns in its top-k."""
+    _, truth = exact_index.search(queries, k)
+    _, found = index.search(queries, k)
+    hits = [len(set(t[t >= 0]) & set(f[f >= 0])) for t, f in zip(truth, found)]
+    return sum(hits) / (k * len(queries))
+
+
+def benchmark(source, index_types=INDEX_TYPES, k=10, n_queries=200, **params):
+    """Print build time, memory, query latency and recall@k for each index type.
+
+    source is any saved FAISS index; queries are stored vectors with a little
+    noise, and an exact flat copy of source is the ground truth.
+    """
+    exact = build_ann_index(source, "flat")
+    n = exact.ntotal
+    rng = np.random.default_rng(1)
+    queries = reconstruct(exact, rng.choice(n, size=min(n, n_queries), replace=False))
+    queries += rng.normal(scale=0.01, size=queries.shape).astype(np.float32)
+    print(f"{n} vectors x {exact.d} dims, {len(queries)} queries, recall@{k}")
+    print(
+        f"{'type':<8}{'factory':<16}{'build s':>9}{'MB':>10}{'ms/query':>10}{'recall':>8}"
+    )
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_ann_index(exact, index_type, **params)
+        build_s = time.perf_counter() - start
+        if index is None:
+            print(f"{index_type:<8}too few vectors to train")
+            continue
+        start = time.perf_counter()
+        index.search(queries, k)
+        query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        print(
+            f"{index_type:<8}{factory_key(index_kind(index), exact.d, n):<16}"
+            f"{build_s:>9.2f}{index_memory_bytes(index) / 2**20:>10.1f}"
+            f"{query_ms:>10.3f}{recall_at_k(exact, index, queries, k):>8.3f}"
+        )
+
+
+def _previous(folder):
+    return folder.with_name(f"{folder.name}.old")
+
+
+def recover_index(folder):
+    """Put the previous index back if a save died between its two renames."""
+    folder = Path(folder)
+    previous = _previous(folder)
+    if previous.exists() and not folder.exists():
+        os.replace(previous, folder)
+
+
+def save_index(vector_db, folder, fingerprint):
+    """Write the index, docstore and fingerprint, then swap the folder in.
+
+    The new copy is written beside the live one, which is renamed aside before
+    the new one takes its place and deleted only afterwards, so a crash at any
+    point leaves a complete index that recover_index() can restore.
+    """
+    folder = Path(folder)
+    tmp = folder.with_name(f"{folder.name}.tmp-{os.getpid()}")
+    vector_db.save_local(str(tmp))
+    (tmp / "fingerprint").write_text(fingerprint)
+    (tmp / "model").write_text(embedding_model_id(vector_db.embedding_function))
+    recover_index(folder)
+    previous = _previous(folder)
+    if previous.exists():
+        shutil.rmtree(previous)
+    if folder.exists():
+        os.replace(folder, previous)
+    os.replace(tmp, folder)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def load_index(
+    folder, embeddings, mmap=True, cls=FAISS, nprobe=NPROBE, ef_search=EF_SEARCH
+):
+    """Load a saved index; with mmap the vectors stay on disk until touched."""
+    folder = Path(folder)
+    recover_index(folder)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(str(folder / "index.faiss"), flags)
+    set_search_params(index, nprobe, ef_search)
+    # The pickle is one we wrote ourselves in save_index
+    with open(folder / "index.pkl", "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return cls(embeddings, index, docstore, index_to_docstore_id)
+
+
+class IncrementalIndex:
+    """A saved FAISS index kept in step with a changing corpus.
+
+    Documents are identified by document_id, so upsert() embeds only texts the
+    index has not seen and sync() also deletes IDs that left the corpus.
+    Deletes are tombstones, and re-adding a deleted document just clears its
+    tombstone; once they pass compact_ratio of the index a
+    background thread rebuilds it and swaps the new store in. Searches keep
+    running against the old store meanwhile.
+    """
+
+    def __init__(
+        self,
+        name,
+        embeddings,
+        index_root=INDEX_ROOT,
+        compact_ratio=0.2,
+        index_type=INDEX_TYPE,
+    ):
+        self.name = name
+        self.embeddings = embeddings
+        self.folder = Path(index_root) / name
+        self.compact_ratio = compact_ratio
+        self.index_type = index_type
+        # Serializes writers (upsert/delete/compact/save); readers never block
+        self._write_lock = threading.RLock()
+        self._compactor = None
+        self.vector_db = None
+        recover_index(self.folder)
+        saved_model = self.folder / "model"
+        if saved_model.exists() and saved_model.read_text() == embedding_model_id(
+            embeddings
+        ):
+            self.vector_db = load_index(
+                self.folder, embeddings, mmap=False, cls=TombstoneFAISS
+            )
+
+    def ids(self):
+        return self.vector_db.live_ids() if self.vector_db else set()
+
+    @property
+    def version(self):
+        return store_version(self.vector_db)
+
+    def upsert(self, documents):
+        """Embed and add documents whose ID is not in the index; returns how many."""
+        with self._write_lock:
+            existing = self.ids()
+            new = {}
+            for doc in documents:
+                doc_id = document_id(doc)
+                if doc_id not in existing:
+                    new[doc_id] = doc
+            # Deleted but not yet compacted: the same content is still indexed
+            restored = self._restore(new)
+            for doc_id in restored:
+                del new[doc_id]
+            if not new:
+                return len(restored)
+            docs = list(new.values())
+            vectors = self.embeddings.embed_documents([d.page_content for d in docs])
+            return len(restored) + self.add_embedded(docs, vectors)
+
+    def add_embedded(self, documents, vectors):
+        """Add documents whose vectors were computed elsewhere; returns how many."""
+        ids = [document_id(doc) for doc in documents]
+        text_embeddings = [(doc.page_content, v) for doc, v in zip(documents, vectors)]
+        metadatas = [doc.metadata for doc in documents]
+        with self._write_lock:
+            if self.vector_db is None:
+                self.vector_db = TombstoneFAISS.from_embeddings(
+                    text_embeddings, self.embeddings, metadatas=metadatas, ids=ids
+                )
+                return len(ids)
+            # IDs are content hashes, so a tombstoned copy is identical to the
+            # re-added document and only needs un-deleting
+            restored = self._restore(ids)
+            added = [i for i, id_ in enumerate(ids) if id_ not in restored]
+            if added:
+                self.vector_db.add_embeddings(
+                    [text_embeddings[i] for i in added],
+                    metadatas=[metadatas[i] for i in added],
+                    ids=[ids[i] for i in added],
+                )
+            return len(ids)
+
+    def _restore(self, ids):
+        with self._write_lock:
+            if self.vector_db is None:
+                return set()
+            restored = self.vector_db.deleted_ids & set(ids)
+            if restored:
+                self.vector_db.restore(restored)
+            return restored
+
+    def delete(self, ids):
+        """Hide ids from search now; the vectors are dropped at the next compaction."""
+        with self._write_lock:
+            ids = set(ids) & self.ids()
+            if not ids:
+                return 0
+            self.vector_db.mark_deleted(ids)
+            total = len(self.vector_db.index_to_docstore_id)
+            if len(self.vector_db.deleted_ids) > self.compact_ratio * total:
+                self.compact(background=True)
+            return len(ids)
+
+    def sync(self, documents):
+        """Make the index hold exactly documents; returns (added, deleted)."""
+        with self._write_lock:
+            wanted = {document_id(doc) for doc in documents}
+            added = self.upsert(documents)
+            deleted = self.delete(self.ids() - wanted)
+            return added, deleted
+
+    def _compact_now(self):
+        with self._write_lock:
+            if self.vector_db is not None and self.vector_db.deleted_ids:
+                self.vector_db = self.vector_db.compacted()
+
+    def compact(self, background=False):
+        """Rebuild without tombstoned vectors, optionally on a background thread."""
+        if not background:
+            self._compact_now()
+            return
+        if self._compactor is None or not self._compactor.is_alive():
+            self._compactor = threading.Thread(target=self._compact_now, daemon=True)
+            self._compactor.start()
+
+    def save(self, fingerprint=""):
+        """Compact, convert to index_type if needed, and write the index to disk."""
+        with self._write_lock:
+            self._compact_now()
+            if (
+                self.vector_db is not None
+                and index_kind(self.vector_db.index) != self.index_type
+            ):
+                self.vector_db = convert_store(self.vector_db, self.index_type)
+            if self.vector_db is not None:
+                self.folder.parent.mkdir(parents=True, exist_ok=True)
+                save_index(self.vector_db, self.folder, fingerprint)
+
+    def as_retriever(self, **kwargs):
+        """Retriever that always searches the current store, even after a swap."""
+        return LiveRetriever(index=self, retriever_kwargs=kwargs)
+
+
+class LiveRetriever(BaseRetriever):
+    """Looks up index.vector_db on every call so compaction swaps are picked up."""
+
+    index: object
+    retriever_kwargs: dict = {}
+    """Passed to FAISS.as_retriever, e.g. search_kwargs={"k": 3}."""
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        retriever = self.index.vector_db.as_retriever(**self.retriever_kwargs)
+        return retriever.invoke(query)
+
+
+def load_or_build(
+    documents,
+    embeddings,
+    name,
+    index_root=INDEX_ROOT,
+    mmap=True,
+    index_type=INDEX_TYPE,
+):
+    """Return a FAISS store for documents, embedding only what isn't saved yet.
+
+    An unchanged corpus is loaded straight from disk; a changed one is brought
+    up to date incrementally and saved again.
+    """
+    folder = Path(index_root) / name
+    fingerprint = corpus_fingerprint(documents, embeddings, index_type)
+    recover_index(folder)
+    saved = folder / "fingerprint"
+    if saved.exists() and saved.read_text() == fingerprint:
+        print(f"Loaded FAISS index '{name}' from {folder}")
+        return load_index(folder, embeddings, mmap=mmap)
+
+    index = IncrementalIndex(
+        name, embeddings, index_root=index_root, index_type=index_type
+    )
+    added, deleted = index.sync(documents)
+    index.save(fingerprint)
+    print(f"Updated FAISS index '{name}' (+{added} -{deleted} documents) in {folder}")
+    return index.vector_db
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["benchmark"])
+    parser.add_argument("name", help="saved index under FAISS_INDEX_DIR")
+    parser.add_argument("--types", nargs="+", default=INDEX_TYPES, choices=INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=NPROBE)
+    parser.add_argument("--ef-search", type=int, default=EF_SEARCH)
+    args = parser.parse_args()
+    benchmark(
+        faiss.read_index(str(Path(INDEX_ROOT) / args.name / "index.faiss")),
+        args.types,
+        k=args.k,
+        nprobe=args.nprobe,
+        ef_search=args.ef_search,
+    )
@@ -3,11 +3,19 @@ A Minimal "Calculator" Tool Using LangGraph
 Converted from LangChain example by tdiprima
 """
 
+import sys
+from pathlib import Path
 from typing import TypedDict
 
 from langchain_openai import OpenAI
 from langgraph.graph import END, StateGraph
 
+# Shared helpers live in ../LangChain
+sys.path.append(str(Path(__file__).resolve().parent.parent / "LangChain"))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 
 # Define the state that will be maintained throughout the graph
 class AgentState(TypedDict):
@@ -1,9 +1,17 @@
+import sys
+from pathlib import Path
 from typing import List, TypedDict
 
 from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph
 
+# Shared helpers live in ../LangChain
+sys.path.append(str(Path(__file__).resolve().parent.parent / "LangChain"))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 
 class State(TypedDict, total=False):
     history: List[dict]  # list of message dicts
@@ -1,3 +1,5 @@
+import sys
+from pathlib import Path
 from typing import TypedDict
 
 from langchain.tools import tool
@@ -5,6 +7,12 @@ from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph
 
+# Shared helpers live in ../LangChain
+sys.path.append(str(Path(__file__).resolve().parent.parent / "LangChain"))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 
 # --------- STEP 1: Define State Schema ---------
 class State(TypedDict):
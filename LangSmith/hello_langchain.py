@@ -1,6 +1,15 @@
 # Based on https://smith.langchain.com/onboarding
+import sys
+from pathlib import Path
+
 from langchain_openai import ChatOpenAI
 
+# Shared helpers live in ../LangChain
+sys.path.append(str(Path(__file__).resolve().parent.parent / "LangChain"))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 llm = ChatOpenAI()
 # llm = ChatOpenAI(verbose=True)
 # llm.invoke("Hello! Who are you?")
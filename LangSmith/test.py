@@ -1,7 +1,15 @@
 import os
+import sys
+from pathlib import Path
 
 from langchain_openai import ChatOpenAI
 
+# Shared helpers live in ../LangChain
+sys.path.append(str(Path(__file__).resolve().parent.parent / "LangChain"))
+from llm_cache import setup_llm_cache  # noqa: E402
+
+setup_llm_cache()
+
 os.environ["LANGSMITH_TRACING"] = "true"
 os.environ["LANGSMITH_API_KEY"] = "your-api-key"
 os.environ["LANGSMITH_PROJECT"] = "test-project-123"